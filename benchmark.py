@@ -0,0 +1,212 @@
+# Benchmarks SolvingLogic.auto_solve and the individual rules over puzzle json files.
+#
+# For every puzzle and stage it records the wall time (best of --repeats runs), the number of thinking ahead nodes (every call of the lookahead
+# recursion, at any depth - the same count for the Board and BitBoard engines), the number of exact search nodes and the peak memory (tracemalloc).
+# Per rule invocations, cells crossed, queens placed and time come from the solver's events (a CounterSink), under "rules".
+#
+# Usage:
+#   python benchmark.py --save-baseline benchmark_baseline.json                 # record a baseline
+#   python benchmark.py --baseline benchmark_baseline.json --threshold 0.25     # exits with 1 if anything got more than 25% worse
+#   python benchmark.py --corpus some/other/puzzles                            # benchmark other puzzles (default: tests/puzzle_starts)
+#   python benchmark.py --generate 12:20 16:10 --stages auto_solve             # benchmark generated puzzles (20 12x12 and 10 16x16, always the same ones)
+
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from src.queens_board import Board
+from src.bitboard import BitBoard
+from src.puzzle_generator import PuzzleGenerator
+from src.solver_events import CounterSink
+from src.solving_logic import SolvingLogic
+
+
+PUZZLE_START_DIRECTORY_PATH = "tests/puzzle_starts"
+GENERATE_SEED = 0
+"""Seed for --generate, so that the generated puzzles are the same from run to run (and can be compared with a baseline)"""
+
+RED = "\033[31m"
+RESET = "\033[0m"
+GREEN = "\033[32m"
+
+STAGES: dict[str, Callable[[Board], object]] = {
+    "auto_solve": SolvingLogic.auto_solve,
+    "exact_solve": SolvingLogic.exact_solve,
+    "mark_queens": SolvingLogic.mark_queens_where_certain,
+    "axiom_1": SolvingLogic.axiom_1_should_not_block_color_sets,
+    "axiom_1_think_ahead_2": lambda board: SolvingLogic.axiom_1_should_not_block_color_sets(board, 2),
+    "axiom_1_think_ahead_3": lambda board: SolvingLogic.axiom_1_should_not_block_color_sets(board, 3),
+    "axiom_2": SolvingLogic.axiom_2_color_common_holdings,
+}
+"""Stage name -> function run on a fresh board of the puzzle"""
+
+METRICS = ["seconds", "lookahead_calls", "search_nodes", "peak_memory_bytes"]
+
+
+class Counters:
+    """Counts calls to the methods we care about, by wrapping them while counting() is active.
+
+    The methods wrapped are the ones that recurse, so every node is counted - not just the top level calls:
+    - lookahead_calls: Board.would_cell_block_color_set_n and BitBoard._would_block_n (what the BitBoard's would_cell_block_color_set_n
+      goes through), both called once per (cell, depth) visited by thinking ahead - so the two engines can be compared.
+    - search_nodes: BitBoard._search, the exact search.
+    """
+
+    lookahead_calls: int
+    search_nodes: int
+
+    WRAPPED = [
+        (Board, "would_cell_block_color_set_n", "lookahead_calls"),
+        (BitBoard, "_would_block_n", "lookahead_calls"),
+        (BitBoard, "_search", "search_nodes"),
+    ]
+
+    def __init__(self):
+        self.lookahead_calls = 0
+        self.search_nodes = 0
+
+    @contextmanager
+    def counting(self) -> Iterator['Counters']:
+        """Reset the counts and count the calls made within the with block. The methods are only wrapped in the meantime, so timing isn't slowed down."""
+        self.lookahead_calls = 0
+        self.search_nodes = 0
+        originals = [(cls, method_name, cls.__dict__[method_name]) for cls, method_name, _ in Counters.WRAPPED]
+        for cls, method_name, counter_name in Counters.WRAPPED: self._wrap(cls, method_name, counter_name)
+        try: yield self
+        finally:
+            for cls, method_name, method in originals: setattr(cls, method_name, method)
+
+    def _wrap(self, cls: type, method_name: str, counter_name: str):
+        method = getattr(cls, method_name)
+        def wrapper(*args, **kwargs):
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+            return method(*args, **kwargs)
+        setattr(cls, method_name, wrapper)
+
+
+def generate_puzzles(specs: list[str]) -> dict[str, dict]:
+    """The puzzles for --generate, by name. Each spec is SIZE:COUNT."""
+    puzzles = {}
+    for spec in specs:
+        size, _, count = spec.partition(":")
+        generator = PuzzleGenerator(f"{GENERATE_SEED}-{size}")
+        for number in range(0, int(count or 1)):
+            puzzles[f"generated/{size}x{size}_{number:03d}"] = generator.generate(int(size))
+    return puzzles
+
+
+def measure(puzzle: dict, stage: Callable[[Board], object], repeats: int, counters: Counters) -> dict:
+    """Run the stage on fresh boards of the puzzle (as loaded from its json) and measure it."""
+    # time (without tracemalloc, which slows things down a lot, and without any solver event listeners)
+    seconds = None
+    for _ in range(0, repeats):
+        board = Board.from_dict(puzzle)
+        start = time.perf_counter()
+        with SolvingLogic.events.listening_only(): stage(board)
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds: seconds = elapsed
+
+    # per rule metrics
+    counter_sink = CounterSink()
+    board = Board.from_dict(puzzle)
+    with SolvingLogic.events.listening_only(counter_sink): stage(board)
+
+    # counters and memory
+    board = Board.from_dict(puzzle)
+    tracemalloc.start()
+    with SolvingLogic.events.listening_only(), counters.counting(): stage(board)
+    _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": seconds,
+        "lookahead_calls": counters.lookahead_calls,
+        "search_nodes": counters.search_nodes,
+        "peak_memory_bytes": peak_memory_bytes,
+        "rules": counter_sink.to_dict()
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float, min_seconds: float) -> list[str]:
+    """Compare results with the baseline. A metric regresses if it is more than threshold (e.g. 0.25 for 25%) worse.
+
+    Times where both runs are under min_seconds are ignored, as those are mostly noise.
+    """
+    regressions = []
+    for puzzle, stages in results.items():
+        for stage, metrics in stages.items():
+            baseline_metrics = baseline.get(puzzle, {}).get(stage)
+            if baseline_metrics is None: continue # new puzzle or stage
+            for metric in METRICS:
+                new = metrics[metric]; old = baseline_metrics.get(metric)
+                if old is None: continue
+                if metric == "seconds" and max(new, old) < min_seconds: continue
+                if new > old * (1 + threshold):
+                    regressions.append(f"{puzzle} {stage} {metric}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the solver. Optionally compare with a baseline and fail on regressions.")
+    parser.add_argument("--corpus", nargs="+", default=None, help=f"Directories of puzzle json files (default: {PUZZLE_START_DIRECTORY_PATH}, unless --generate is given)")
+    parser.add_argument("--generate", nargs="+", default=[], metavar="SIZE:COUNT",
+                        help="Also benchmark COUNT generated SIZExSIZE puzzles (see src/puzzle_generator.py) - with a fixed seed, so always the same ones")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES.keys()), default=list(STAGES.keys()))
+    parser.add_argument("--repeats", type=int, default=5, help="Timing is the best of this many runs")
+    parser.add_argument("--output", help="Write the results to this json file")
+    parser.add_argument("--save-baseline", help="Write the results to this json file as the new baseline")
+    parser.add_argument("--baseline", help="Compare with this baseline json file, exit with 1 if anything regressed")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression (default 0.25, i.e. 25%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Ignore timings under this many seconds when comparing")
+    args = parser.parse_args()
+
+    corpus = args.corpus
+    if corpus is None: corpus = [] if args.generate else [PUZZLE_START_DIRECTORY_PATH]
+    puzzles: dict[str, dict] = {} # name (the file path for json files) -> puzzle
+    for directory in corpus:
+        for file in sorted(os.listdir(directory)):
+            if not file.endswith(".json"): continue
+            with open(f"{directory}/{file}", "rt") as f: puzzles[f"{directory}/{file}"] = json.load(f)
+    puzzles.update(generate_puzzles(args.generate))
+
+    counters = Counters()
+    results: dict[str, dict[str, dict]] = {} # puzzle -> stage -> metrics
+    for name, puzzle in puzzles.items():
+        results[name] = {}
+        for stage in args.stages:
+            metrics = measure(puzzle, STAGES[stage], args.repeats, counters)
+            results[name][stage] = metrics
+            print(f"{name:45} {stage:22} {metrics['seconds'] * 1000:9.3f} ms {metrics['lookahead_calls']:8} lookahead calls "
+                  f"{metrics['search_nodes']:6} search nodes {metrics['peak_memory_bytes'] / 1024:9.1f} KiB")
+
+    totals = {stage: sum(stages[stage]["seconds"] for stages in results.values()) for stage in args.stages}
+    for stage, seconds in totals.items(): print(f"Total {stage:22} {seconds * 1000:9.3f} ms")
+
+    # where the time of auto_solve goes, by rule
+    if "auto_solve" in args.stages:
+        for rule in sorted({rule for stages in results.values() for rule in stages["auto_solve"]["rules"]}):
+            rule_stats = [stages["auto_solve"]["rules"][rule] for stages in results.values() if rule in stages["auto_solve"]["rules"]]
+            print(f"auto_solve {rule:17} {sum(stats['invocations'] for stats in rule_stats):7} runs {sum(stats['seconds'] for stats in rule_stats) * 1000:9.3f} ms "
+                  f"{sum(stats['cells_crossed'] for stats in rule_stats):7} crossed {sum(stats['queens_placed'] for stats in rule_stats):5} queens")
+
+    for filepath in [args.output, args.save_baseline]:
+        if filepath:
+            with open(filepath, "wt") as f: json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "rt") as f: baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_seconds)
+        if regressions:
+            for regression in regressions: print(f"{RED}Regression: {regression}{RESET}")
+            sys.exit(1)
+        print(f"{GREEN}No regressions.{RESET}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Converts between puzzle json files (plus their truth pickles) and a corpus file - many puzzles packed into one binary file
+# (see src/corpus.py). A corpus file loads much quicker than thousands of json files, and solve_batch.py takes one as a source.
+#
+# Usage:
+#   python convert_corpus.py pack tests/puzzle_starts --truth-dir tests/truth --output tests.qnsc
+#   python convert_corpus.py pack corpus/12 corpus/14 --output corpus.qnsc
+#   python convert_corpus.py unpack tests.qnsc --output-dir unpacked/puzzle_starts --truth-dir unpacked/truth
+#
+# pack takes the *.json files of each directory (sorted by name). The truth pickle of puzzle.json is puzzle.pkl in --truth-dir, if there is one.
+# unpack writes the json files the same way the GUI saves them, and a truth pickle for every puzzle with a solution (if --truth-dir is given).
+
+
+import argparse
+import json
+import os
+import pickle
+import sys
+
+from src.corpus import CorpusReader, CorpusWriter
+
+
+def pack(directories: list[str], output: str, truth_directory: str | None = None) -> int:
+    """Pack the puzzle json files of the directories (and their truth pickles) into a corpus file. Returns the number of puzzles."""
+    count = 0
+    with CorpusWriter(output) as writer:
+        for directory in directories:
+            for file in sorted(os.listdir(directory)):
+                if not file.endswith(".json"): continue
+                name = os.path.splitext(file)[0]
+                with open(os.path.join(directory, file), "rt") as f: puzzle = json.load(f)
+                solution = None
+                if truth_directory is not None and os.path.isfile(os.path.join(truth_directory, f"{name}.pkl")):
+                    with open(os.path.join(truth_directory, f"{name}.pkl"), "rb") as f: solution = pickle.load(f)
+                writer.add(name, puzzle, solution)
+                count += 1
+    return count
+
+
+def unpack(corpus_path: str, output_directory: str, truth_directory: str | None = None) -> int:
+    """Write the puzzles of a corpus file back out as json files (and truth pickles). Returns the number of puzzles."""
+    os.makedirs(output_directory, exist_ok=True)
+    if truth_directory is not None: os.makedirs(truth_directory, exist_ok=True)
+    with CorpusReader(corpus_path) as corpus:
+        for corpus_puzzle in corpus:
+            with open(os.path.join(output_directory, f"{corpus_puzzle.name}.json"), "wt") as f:
+                json.dump(corpus_puzzle.puzzle, f, indent=4)
+            if truth_directory is not None and corpus_puzzle.solution is not None:
+                with open(os.path.join(truth_directory, f"{corpus_puzzle.name}.pkl"), "wb") as f:
+                    pickle.dump(corpus_puzzle.solution, f)
+        return len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between puzzle json files (and truth pickles) and a corpus file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="json files -> corpus file")
+    pack_parser.add_argument("directories", nargs="+", help="Directories of puzzle json files")
+    pack_parser.add_argument("--output", required=True, help="Corpus file to write")
+    pack_parser.add_argument("--truth-dir", default=None, help="Directory of truth pickles to pack with the puzzles")
+    unpack_parser = subparsers.add_parser("unpack", help="corpus file -> json files")
+    unpack_parser.add_argument("corpus", help="Corpus file to read")
+    unpack_parser.add_argument("--output-dir", required=True, help="Directory to write the json files in (created if needed)")
+    unpack_parser.add_argument("--truth-dir", default=None, help="Directory to write the truth pickles in (created if needed)")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        count = pack(args.directories, args.output, args.truth_dir)
+        print(f"Packed {count} puzzles into {args.output}", file=sys.stderr)
+    else:
+        count = unpack(args.corpus, args.output_dir, args.truth_dir)
+        print(f"Unpacked {count} puzzles into {args.output_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Generates puzzles with exactly one solution (see src/puzzle_generator.py), e.g. to build large corpora for benchmark.py and solve_batch.py.
+# Each puzzle is saved as a json file in the same format the GUI saves.
+#
+# Usage:
+#   python generate_puzzles.py --size 12 --count 1000 --output-dir corpus/12
+#   python generate_puzzles.py --size 20 --count 200 --seed 7 --workers 8 --output-dir corpus/20
+#
+# The same seed (and size) gives the same puzzles, however many workers are used.
+# Generating gets slow for big boards (see PuzzleGenerator.generate): about 0.5 s per puzzle at 20x20, 2-3 s at 25x25 and 10-15 s at 30x30.
+
+
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from src.puzzle_generator import PuzzleGenerator
+
+
+def generate_puzzle(size: int, seed: int, number: int) -> tuple[int, dict]:
+    """Generate puzzle number `number` of the batch. Runs in the worker processes."""
+    # every puzzle gets its own seed, so the result doesn't depend on which worker generates it
+    return number, PuzzleGenerator(f"{seed}-{size}-{number}").generate(size)
+
+
+def _generate_puzzle_task(task: tuple[int, int, int]) -> tuple[int, dict]:
+    return generate_puzzle(*task)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate puzzles with exactly one solution, as json files.")
+    parser.add_argument("--size", type=int, required=True, help="Rows (and columns, and colors) of each puzzle")
+    parser.add_argument("--count", type=int, default=100, help="Number of puzzles (default: 100)")
+    parser.add_argument("--seed", type=int, default=0, help="Same seed, same puzzles (default: 0)")
+    parser.add_argument("--output-dir", required=True, help="Directory to save the json files in (created if needed)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: number of CPUs)")
+    args = parser.parse_args()
+    if args.size < 1 or args.size in [2, 3]: parser.error(f"there is no {args.size}x{args.size} puzzle (the size must be 1 or at least 4)")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    tasks = ((args.size, args.seed, number) for number in range(0, args.count))
+    with Pool(processes=max(1, args.workers)) as pool:
+        for done, (number, puzzle) in enumerate(pool.imap_unordered(_generate_puzzle_task, tasks), start=1):
+            file_path = os.path.join(args.output_dir, f"{args.size}x{args.size}_{args.seed}_{number:05d}.json")
+            with open(file_path, "wt") as f:
+                json.dump(puzzle, f, indent=4)
+            print(f"{done}/{args.count} {file_path} ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
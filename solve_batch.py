@@ -0,0 +1,176 @@
+# Headless batch solver. Solves a directory (or glob) of puzzle json files, or corpus files (see convert_corpus.py), across a pool of worker processes
+# and streams one json line per puzzle to stdout as soon as it is solved.
+#
+# Usage:
+#   python solve_batch.py tests/puzzle_starts
+#   python solve_batch.py "examples/*.json" --workers 4 --mode exact
+#   python solve_batch.py corpus/12 --mode batch    (needs NumPy - solves the puzzles of a size together, see src/batch_solver.py)
+#   python solve_batch.py corpus.qnsc --workers 8    (every puzzle of a corpus file - listed as corpus.qnsc#0, corpus.qnsc#1, ...)
+#   python solve_batch.py tests/puzzle_starts --cache    (answers the puzzles solved before from the solution cache, see src/solution_cache.py)
+#
+# Each output line looks like:
+#   {"puzzle": "tests/puzzle_starts/20250408.json", "outcome": "solved", "turns": 12, "seconds": 0.0012, "solution": [["x", "♕", ...], ...]}
+# outcome is "solved", "stuck" (auto mode could not finish), "no solution" (exact mode) or "error" (with an "error" message instead of a solution).
+# In batch mode, turns is null and seconds is the puzzle's share of its batch.
+
+
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing import Pool
+from typing import Iterator
+
+from src.corpus import CorpusReader
+from src.queens_board import Board, CellStatus
+from src.solution_cache import SolutionCache
+from src.solving_logic import SolvingLogic
+
+try: from src.batch_solver import BatchSolver
+except ImportError: BatchSolver = None # needs NumPy, which is optional
+
+
+def iter_puzzle_paths(sources: list[str]) -> Iterator[str]:
+    """Yields the json file paths for each source, lazily. A source can be a directory (its *.json files), a glob pattern or a file.
+    For a corpus file, yields path#k for each of its puzzles (see load_board).
+    """
+    for source in sources:
+        if CorpusReader.is_corpus_file(source):
+            with CorpusReader(source) as corpus:
+                for k in range(0, len(corpus)): yield f"{source}#{k}"
+        elif os.path.isdir(source):
+            with os.scandir(source) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(".json"): yield entry.path
+        else:
+            yield from glob.iglob(source)
+
+
+_corpus_readers: dict[str, CorpusReader] = {}
+"""Corpus files opened by this (worker) process, by path - each is only mapped once"""
+
+
+def load_board(path: str) -> Board:
+    """The board of a puzzle json file, or of puzzle k of a corpus file if path is corpus_path#k"""
+    corpus_path, _, k = path.rpartition("#")
+    if corpus_path and k.isdigit():
+        if corpus_path not in _corpus_readers and CorpusReader.is_corpus_file(corpus_path):
+            _corpus_readers[corpus_path] = CorpusReader(corpus_path)
+        if corpus_path in _corpus_readers: return _corpus_readers[corpus_path].board(int(k))
+    return Board.from_json(path)
+
+
+def solve_board(board: Board, mode: str, cancel: threading.Event | None = None) -> tuple[str, int | None]:
+    """Solve the board with the mode's solver (auto or exact). cancel is passed on to the solver (see SolvingLogic).
+
+    Returns:
+        tuple[str, int | None]: The outcome ("solved", "stuck" or "no solution") and the turns auto_solve took (None in exact mode).
+    """
+    turns = None
+    with SolvingLogic.events.listening_only(): # the solver's progress messages would get mixed into our output
+        if mode == "exact": solved = SolvingLogic.exact_solve(board, cancel)
+        else:
+            turns = SolvingLogic.auto_solve(board, cancel=cancel)
+            solved = board.is_game_over()
+
+    if solved: outcome = "solved"
+    elif mode == "exact": outcome = "no solution"
+    else: outcome = "stuck"
+    return outcome, turns
+
+
+def solve_puzzle(path: str, mode: str) -> dict:
+    """Solve the puzzle at path (see load_board). Runs in the worker processes."""
+    start = time.perf_counter()
+    try:
+        board = load_board(path)
+        outcome, turns = solve_board(board, mode)
+    except Exception as e:
+        return {"puzzle": path, "outcome": "error", "error": repr(e), "seconds": time.perf_counter() - start}
+
+    return {
+        "puzzle": path,
+        "outcome": outcome,
+        "turns": turns,
+        "seconds": time.perf_counter() - start,
+        "solution": board.to_status_grid()
+    }
+
+
+def _solve_puzzle_task(task: tuple[str, str]) -> dict:
+    return solve_puzzle(*task)
+
+
+def solve_puzzles_together(paths: list[str]) -> list[dict]:
+    """Solve the puzzles at paths (see load_board) with the BatchSolver, the ones of the same size together. Runs in the worker processes."""
+    results = []
+    boards_by_size: dict[tuple[int, int], list[tuple[str, Board]]] = {}
+    for path in paths:
+        try: board = load_board(path)
+        except Exception as e:
+            results.append({"puzzle": path, "outcome": "error", "error": repr(e), "seconds": 0.0})
+            continue
+        boards_by_size.setdefault((board.height, board.length), []).append((path, board))
+
+    for group in boards_by_size.values():
+        start = time.perf_counter()
+        with SolvingLogic.events.listening_only():
+            status_grids = BatchSolver.solve([board for _, board in group])
+        seconds = (time.perf_counter() - start) / len(group)
+        for (path, board), status_grid in zip(group, status_grids):
+            queen_count = sum(row.count(CellStatus.QUEEN.value) for row in status_grid)
+            results.append({
+                "puzzle": path,
+                "outcome": "solved" if queen_count == board.height else "stuck",
+                "turns": None,
+                "seconds": seconds,
+                "solution": status_grid
+            })
+    return results
+
+
+def use_solution_cache(path: str | None):
+    """Pool initializer: let auto_solve answer the puzzles solved before from the solution cache at path (and add new ones)."""
+    if path is not None: SolvingLogic.solution_cache = SolutionCache(path)
+
+
+def iter_chunks(paths: Iterator[str], size: int) -> Iterator[list[str]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a batch of puzzle json files or corpus files, printing one json line per puzzle.")
+    parser.add_argument("sources", nargs="+", help="Directories, glob patterns, json files or corpus files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--mode", choices=["auto", "exact", "batch"], default="auto",
+                        help="auto: SolvingLogic.auto_solve (default). exact: SolvingLogic.exact_solve. batch: BatchSolver (needs NumPy)")
+    parser.add_argument("--chunksize", type=int, default=8, help="Puzzles handed to a worker at a time")
+    parser.add_argument("--batch-size", type=int, default=256, help="Puzzles handed to a worker at a time in batch mode (default: 256)")
+    parser.add_argument("--cache", nargs="?", const=SolutionCache.DEFAULT_PATH, default=None,
+                        help=f"auto mode: answer the puzzles solved before from the solution cache at this path, and add the new ones (default path: {SolutionCache.DEFAULT_PATH})")
+    args = parser.parse_args()
+    if args.mode == "batch" and BatchSolver is None: parser.error("batch mode needs NumPy (pip install numpy)")
+
+    with Pool(processes=max(1, args.workers), initializer=use_solution_cache, initargs=(args.cache,)) as pool:
+        if args.mode == "batch":
+            results = (result for results in pool.imap_unordered(solve_puzzles_together, iter_chunks(iter_puzzle_paths(args.sources), args.batch_size))
+                       for result in results)
+        else:
+            tasks = ((path, args.mode) for path in iter_puzzle_paths(args.sources))
+            results = pool.imap_unordered(_solve_puzzle_task, tasks, chunksize=args.chunksize)
+        for result in results:
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# Local solver service. Keeps a pool of warm solver processes and answers puzzles over HTTP, on localhost or a Unix socket,
+# so other tools can call the solver without starting a Python process (and importing everything) for every puzzle.
+# Only needs the standard library - no tkinter.
+#
+# Usage:
+#   python solve_server.py                                       # http://127.0.0.1:8765
+#   python solve_server.py --port 9000 --workers 4 --time-limit 5
+#   python solve_server.py --port 0                              # any free port - the one picked is printed
+#   python solve_server.py --unix /tmp/queens.sock               # e.g. curl --unix-socket /tmp/queens.sock http://localhost/solve -d @puzzle.json
+#   python solve_server.py --cache                               # answer the puzzles solved before from the solution cache
+#
+# Endpoints:
+#   POST /solve     The body is a puzzle (the json the GUI saves, see Board.from_dict), answered with one result:
+#                       {"outcome": "solved", "turns": 12, "seconds": 0.0012, "solution": [["x", "♕", ...], ...]}
+#                   or a list of puzzles, answered with a list of results in the same order (an empty list gets an empty list).
+#                   outcome is "solved", "stuck", "no solution" (exact mode), "timeout" or "error" (with an "error" message instead of a solution).
+#                   Query parameters: mode=auto|exact (default auto), time_limit=SECONDS (default --time-limit).
+#   GET /metrics    Request and puzzle counts and latency histograms, in the Prometheus text format.
+#   GET /health     "ok"
+#
+# While a worker is idle, puzzles are handed over one at a time, so the puzzles of a list are solved side by side. Once every worker is busy,
+# the puzzles waiting are handed over in batches (up to --max-batch at a time, spread over the batches that can still be queued), so a busy
+# server doesn't pay the hand-over to a worker process for every puzzle. The time limit counts from when the request arrives. The solve
+# (auto_solve or exact_solve) is cancelled when it runs out, so a slow puzzle doesn't keep its worker from the next ones.
+
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from http import HTTPStatus
+from multiprocessing import Pool
+from urllib.parse import parse_qs, urlsplit
+
+from solve_batch import solve_board, use_solution_cache
+from src.queens_board import Board
+from src.solution_cache import SolutionCache
+from src.solving_logic import SolveCancelled
+
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+GRACE_SECONDS = 1.0
+"""How much longer than the time limit to wait for a worker's result (it should have cancelled itself by then)"""
+
+
+def solve_chunk(tasks: list[tuple[dict, str, float]]) -> list[dict]:
+    """Solve the puzzles (puzzle dict, mode, deadline as a time.time()) one after the other. Runs in the worker processes."""
+    results = []
+    for puzzle, mode, deadline in tasks:
+        start = time.perf_counter()
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            results.append({"outcome": "timeout", "turns": None, "seconds": 0.0, "solution": None})
+            continue
+
+        cancel = threading.Event()
+        timer = threading.Timer(remaining, cancel.set)
+        timer.daemon = True
+        timer.start()
+        try:
+            board = Board.from_dict(puzzle)
+            outcome, turns = solve_board(board, mode, cancel)
+            result = {"outcome": outcome, "turns": turns, "seconds": time.perf_counter() - start, "solution": board.to_status_grid()}
+        except SolveCancelled:
+            result = {"outcome": "timeout", "turns": None, "seconds": time.perf_counter() - start, "solution": None}
+        except Exception as e:
+            result = {"outcome": "error", "error": repr(e), "seconds": time.perf_counter() - start}
+        finally:
+            timer.cancel()
+        results.append(result)
+    return results
+
+
+class Histogram:
+    """A Prometheus style histogram - counts of the observed values per bucket (cumulative), their sum and count."""
+
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    name: str
+    help_text: str
+    buckets: tuple[float, ...]
+    """Upper bounds of the buckets (an +Inf bucket is added)"""
+    counts: list[int]
+    """Values per bucket (not cumulative), the last one being +Inf"""
+    sum: float
+    count: int
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]: i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{self.name}_sum {self.sum}", f"{self.name}_count {self.count}"]
+        return lines
+
+
+class SolverServer:
+    """Answers the HTTP requests (see the top of this file) and hands the puzzles to a pool of worker processes.
+
+    Every puzzle goes into a queue, and up to 2 batches per worker are in the pool at a time. While a worker is idle, the next puzzle is
+    handed over on its own. When every worker has a batch, the puzzles waiting are split over the batches the pool can still take (up to
+    max_batch puzzles each) - so puzzles are batched only when they would have to wait anyway, and a list isn't solved on one worker.
+    """
+
+    workers: int
+    max_batch: int
+    time_limit: float
+    """Default time limit per request, in seconds"""
+    _pool: Pool
+    _loop: asyncio.AbstractEventLoop
+    _queue: asyncio.Queue
+    """(puzzle, mode, deadline, future) of the puzzles waiting for a worker"""
+    _slots: asyncio.Semaphore
+    """Batches the pool can still take"""
+    _batches_in_pool: int
+    _dispatcher: asyncio.Task
+    _request_counts: dict[tuple[str, int], int]
+    """Requests answered, by (path, status code)"""
+    _outcome_counts: dict[str, int]
+    """Puzzles answered, by outcome"""
+    _request_seconds: Histogram
+    _solve_seconds: Histogram
+    _batch_sizes: Histogram
+
+    def __init__(self, workers: int, max_batch: int = 16, time_limit: float = 10.0, cache_path: str | None = None):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.time_limit = time_limit
+        # the workers are all started (and the solver imported in them) now, not on the first request
+        self._pool = Pool(processes=workers, initializer=use_solution_cache, initargs=(cache_path,))
+        self._request_counts = {}
+        self._outcome_counts = {}
+        self._request_seconds = Histogram("queens_request_seconds", "Time to answer a /solve request")
+        self._solve_seconds = Histogram("queens_solve_seconds", "Time a worker took to solve a puzzle")
+        self._batch_sizes = Histogram("queens_batch_size", "Puzzles handed to a worker at a time", (1, 2, 4, 8, 16, 32, 64, 128))
+
+    async def start(self):
+        """Start handing the queued puzzles to the workers. Call from the event loop before serving."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(2 * self.workers) # one batch being solved and the next one waiting, per worker
+        self._batches_in_pool = 0
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    async def solve(self, puzzles: list[dict], mode: str, time_limit: float) -> list[dict]:
+        """Solve the puzzles in the workers. Puzzles not answered within the time limit get a "timeout" result."""
+        if not puzzles: return []
+        deadline = time.time() + time_limit
+        futures = [self._loop.create_future() for _ in puzzles]
+        for puzzle, future in zip(puzzles, futures): self._queue.put_nowait((puzzle, mode, deadline, future))
+        await asyncio.wait(futures, timeout=time_limit + GRACE_SECONDS)
+
+        results = []
+        for future in futures:
+            if future.done(): results.append(future.result())
+            else: results.append({"outcome": "timeout", "turns": None, "seconds": time_limit, "solution": None})
+        for result in results: self._outcome_counts[result["outcome"]] = self._outcome_counts.get(result["outcome"], 0) + 1
+        return results
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._queue.get()]
+            await self._slots.acquire()
+            self._batches_in_pool += 1
+            if self._batches_in_pool > self.workers:
+                # every worker has a batch, so this one waits anyway - take some of what came in along, leaving some for the other free slots
+                free_slots = 2 * self.workers - self._batches_in_pool + 1
+                batch_size = min(self.max_batch, math.ceil((1 + self._queue.qsize()) / free_slots))
+                while len(batch) < batch_size and not self._queue.empty(): batch.append(self._queue.get_nowait())
+            self._batch_sizes.observe(len(batch))
+            self._pool.apply_async(
+                solve_chunk, ([(puzzle, mode, deadline) for puzzle, mode, deadline, _ in batch],),
+                # these are called on the pool's result thread
+                callback=lambda results, batch=batch: self._loop.call_soon_threadsafe(self._finish_batch, batch, results),
+                error_callback=lambda e, batch=batch: self._loop.call_soon_threadsafe(
+                    self._finish_batch, batch, [{"outcome": "error", "error": repr(e), "seconds": 0.0}] * len(batch)
+                )
+            )
+
+    def _finish_batch(self, batch: list[tuple[dict, str, float, asyncio.Future]], results: list[dict]):
+        self._batches_in_pool -= 1
+        self._slots.release()
+        for (_, _, _, future), result in zip(batch, results):
+            if result["outcome"] != "timeout": self._solve_seconds.observe(result["seconds"])
+            if not future.done(): future.set_result(result)
+
+    def render_metrics(self) -> str:
+        lines = ["# HELP queens_requests_total Requests answered", "# TYPE queens_requests_total counter"]
+        for (path, status), count in sorted(self._request_counts.items()):
+            lines.append(f'queens_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines += ["# HELP queens_puzzles_total Puzzles answered", "# TYPE queens_puzzles_total counter"]
+        for outcome, count in sorted(self._outcome_counts.items()):
+            lines.append(f'queens_puzzles_total{{outcome="{outcome}"}} {count}')
+        lines += ["# HELP queens_queued_puzzles Puzzles waiting for a worker", "# TYPE queens_queued_puzzles gauge", f"queens_queued_puzzles {self._queue.qsize()}"]
+        for histogram in [self._request_seconds, self._solve_seconds, self._batch_sizes]: lines += histogram.render()
+        return "\n".join(lines) + "\n"
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the HTTP requests of a connection, one after the other (keep-alive), until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                method, target, version = request_line.decode("latin-1").split(maxsplit=2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version.strip() == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, "/solve", HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                start = time.perf_counter()
+                url = urlsplit(target)
+                path, status, response = url.path, HTTPStatus.OK, None
+                if url.path == "/solve" and method == "POST":
+                    status, response = await self._solve_request(body, parse_qs(url.query))
+                    self._request_seconds.observe(time.perf_counter() - start)
+                elif url.path == "/metrics" and method == "GET": response = self.render_metrics()
+                elif url.path == "/health" and method == "GET": response = "ok\n"
+                elif url.path in ("/solve", "/metrics", "/health"): status, response = HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} not allowed"}
+                else: path, status, response = "other", HTTPStatus.NOT_FOUND, {"error": "not found"}
+                await self._respond(writer, path, status, response, keep_alive)
+                if not keep_alive: break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # client went away, or sent something that isn't HTTP
+        finally:
+            writer.close()
+
+    async def _solve_request(self, body: bytes, query: dict[str, list[str]]) -> tuple[HTTPStatus, object]:
+        try:
+            payload = json.loads(body)
+            mode = query.get("mode", ["auto"])[0]
+            if mode not in ("auto", "exact"): raise ValueError(f"unknown mode {mode}")
+            time_limit = float(query.get("time_limit", [self.time_limit])[0])
+            if not 0 < time_limit < math.inf: raise ValueError("time_limit must be a positive number of seconds")
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+        puzzles = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(puzzle, dict) and {"rows", "cols", "colors"} <= puzzle.keys() for puzzle in puzzles):
+            return HTTPStatus.BAD_REQUEST, {"error": "a puzzle must be an object with rows, cols and colors"}
+        results = await self.solve(puzzles, mode, time_limit)
+        return HTTPStatus.OK, results if isinstance(payload, list) else results[0]
+
+    async def _respond(self, writer: asyncio.StreamWriter, path: str, status: HTTPStatus, response: object, keep_alive: bool):
+        self._request_counts[(path, status.value)] = self._request_counts.get((path, status.value), 0) + 1
+        if isinstance(response, str): body = response.encode(); content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else: body = json.dumps(response, ensure_ascii=False).encode(); content_type = "application/json; charset=utf-8"
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+        if not keep_alive: head += "Connection: close\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+
+async def serve(server: SolverServer, host: str, port: int, unix_path: str | None):
+    await server.start()
+    if unix_path is not None:
+        listener = await asyncio.start_unix_server(server.handle_connection, path=unix_path)
+        print(f"Listening on {unix_path}", flush=True)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port)
+        port = listener.sockets[0].getsockname()[1] # the one picked, if port is 0
+        print(f"Listening on http://{host}:{port}", flush=True)
+    async with listener: await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the solver over HTTP, on localhost or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1 - only this machine)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on, 0 for any free one (default: 8765)")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="Listen on a Unix socket at PATH instead")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Most puzzles handed to a worker at a time (default: 16)")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="Default time limit per request, in seconds (default: 10)")
+    parser.add_argument("--cache", nargs="?", const=SolutionCache.DEFAULT_PATH, default=None,
+                        help=f"Answer the puzzles solved before from the solution cache at this path, and add the new ones (default path: {SolutionCache.DEFAULT_PATH})")
+    args = parser.parse_args()
+    if args.unix is not None and not hasattr(asyncio, "start_unix_server"): parser.error("Unix sockets are not available on this platform")
+
+    server = SolverServer(max(1, args.workers), max(1, args.max_batch), args.time_limit, args.cache)
+    try: asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt: pass
+    finally:
+        server.close()
+        if args.unix is not None and os.path.exists(args.unix): os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
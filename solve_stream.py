@@ -0,0 +1,84 @@
+# Streaming solver for pipelines. Reads puzzles as json lines on stdin and writes a result line to stdout as soon as each one is solved,
+# for as long as stdin stays open - one long running process instead of one per puzzle.
+#
+# Usage:
+#   cat puzzles.jsonl | python solve_stream.py
+#   some_tool | python solve_stream.py --workers 4 --window 64 | other_tool
+#
+# Each input line is a puzzle (the json the GUI saves, see Board.from_dict) on one line, with an optional "id":
+#   {"id": "20250408", "rows": 8, "cols": 8, "colors": [["#80ffff", ...], ...]}
+# Each output line is tagged with that id (the line number if there is none):
+#   {"id": "20250408", "outcome": "solved", "turns": 12, "seconds": 0.0012, "solution": [["x", "♕", ...], ...]}
+# outcome is "solved", "stuck", "no solution" (exact mode) or "error" (with an "error" message instead of a solution).
+#
+# With --workers 1 (the default) the puzzles are solved right here, one after the other, so all a puzzle costs on top of solving it is
+# parsing its line and writing its result. With more workers the results may come out in a different order than the puzzles went in.
+# At most --window puzzles are being solved at a time; after that stdin is only read as results are written, so a slow reader of stdout
+# slows down the reading of stdin instead of the puzzles piling up in memory.
+
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing import Pool
+from typing import Iterable, Iterator
+
+from solve_batch import solve_board, use_solution_cache
+from src.queens_board import Board
+from src.solution_cache import SolutionCache
+
+
+def solve_line(task: tuple[int, str, str]) -> str:
+    """Solve the puzzle of an input line (line number, line, mode), giving the output line. Runs in the worker processes (or in this one)."""
+    number, line, mode = task
+    start = time.perf_counter()
+    puzzle_id = number
+    try:
+        puzzle = json.loads(line)
+        puzzle_id = puzzle.get("id", number)
+        board = Board.from_dict(puzzle)
+        outcome, turns = solve_board(board, mode)
+        result = {"id": puzzle_id, "outcome": outcome, "turns": turns, "seconds": time.perf_counter() - start, "solution": board.to_status_grid()}
+    except Exception as e:
+        result = {"id": puzzle_id, "outcome": "error", "error": repr(e), "seconds": time.perf_counter() - start}
+    return json.dumps(result, ensure_ascii=False) + "\n"
+
+
+def iter_tasks(lines: Iterable[str], mode: str, window: threading.Semaphore | None = None) -> Iterator[tuple[int, str, str]]:
+    """Yields (line number, line, mode) for each non-empty line. If there is a window, waits for a place in it before reading the next line."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip(): continue
+        if window is not None: window.acquire()
+        yield number, line, mode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve puzzles read as json lines on stdin, writing one json line per puzzle to stdout.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes. 1 (the default) solves in this process")
+    parser.add_argument("--window", type=int, default=64, help="Most puzzles being solved at a time with more than 1 worker (default: 64)")
+    parser.add_argument("--mode", choices=["auto", "exact"], default="auto", help="auto: SolvingLogic.auto_solve (default). exact: SolvingLogic.exact_solve")
+    parser.add_argument("--cache", nargs="?", const=SolutionCache.DEFAULT_PATH, default=None,
+                        help=f"auto mode: answer the puzzles solved before from the solution cache at this path, and add the new ones (default path: {SolutionCache.DEFAULT_PATH})")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        use_solution_cache(args.cache)
+        for task in iter_tasks(sys.stdin, args.mode):
+            sys.stdout.write(solve_line(task))
+            sys.stdout.flush()
+        return
+
+    window = threading.BoundedSemaphore(max(1, args.window))
+    with Pool(processes=args.workers, initializer=use_solution_cache, initargs=(args.cache,)) as pool:
+        # the pool reads the tasks (and so stdin) on a thread of its own, waiting on the window
+        for output in pool.imap_unordered(solve_line, iter_tasks(sys.stdin, args.mode, window)):
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            window.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import numpy as np
+
+from src.queens_board import Board, Cell, CellStatus
+
+
+_STATUS_CODES = {CellStatus.BLANK: 0, CellStatus.CROSS: 1, CellStatus.QUEEN: 2}
+"""What ArrayBoard.statuses holds for each CellStatus"""
+_BLANK = _STATUS_CODES[CellStatus.BLANK]
+_QUEEN = _STATUS_CODES[CellStatus.QUEEN]
+
+
+class ArrayBoard(Board):
+    """A Board that also keeps the cell statuses and color ids in NumPy arrays, so that counting the blank cells per row, column and colorset
+    (queen marking, axiom 1, the holdings for axiom 2, ...) is one vectorized reduction instead of a loop over Cell objects.
+
+    Needs NumPy, which is optional - import this module only if you want it. Made the same way as a Board (e.g. ArrayBoard.from_json(filepath))
+    and works everywhere a Board does. The cells stay the source of truth (for the GUI etc.); the arrays follow every change made through
+    set_cell_status and undo_to. Only pays off with use_bitboard=False, as the BitBoard engine keeps its own bitmasks.
+    """
+
+    statuses: np.ndarray
+    """Status code of every cell (0 blank, 1 cross, 2 queen), as statuses[y, x]"""
+    color_ids: np.ndarray
+    """Index of every cell's colorset in color_sets (in insertion order), as color_ids[y, x]"""
+    _colors: list[str]
+    """Colors of the colorsets, in the same order as color_sets"""
+    _cells: list[Cell]
+    """Cells by index (x + length * y)"""
+    __row_ids: np.ndarray
+    """Row of every cell, by index"""
+    __col_ids: np.ndarray
+    """Column of every cell, by index"""
+    _block_arrays: np.ndarray | None
+    """See __get_block_arrays"""
+
+    def __init__(self, length: int, height: int, cells: list[Cell]):
+        super().__init__(length, height, cells)
+        self._cells = [cell for row in self.cell_grid for cell in row]
+        self._colors = list(self.color_sets.keys())
+        color_ids = {color_set.color_id: i for i, color_set in enumerate(self.color_sets.values())}
+
+        self.__row_ids = np.repeat(np.arange(height), length)
+        self.__col_ids = np.tile(np.arange(length), height)
+        self._block_arrays = None
+
+        self.statuses = np.array([_STATUS_CODES[cell.status] for cell in self._cells], dtype=np.int8).reshape(height, length)
+        self.color_ids = np.array([color_ids[cell.color_id] for cell in self._cells], dtype=np.int16).reshape(height, length)
+
+    def set_cell_status(self, cell: Cell, status: CellStatus):
+        super().set_cell_status(cell, status)
+        self.statuses[cell.y, cell.x] = _STATUS_CODES[cell.status]
+
+    def undo_to(self, checkpoint: int):
+        undone_cells = [entry[0] for entry in self._trail[checkpoint:]]
+        super().undo_to(checkpoint)
+        for cell in undone_cells: self.statuses[cell.y, cell.x] = _STATUS_CODES[cell.status]
+
+    def mark_queens_where_certain(self) -> bool:
+        """Mark queens on the board where certain - i.e. the single blank cell of a row, column or colorset. Same order and results as Board.
+
+        Returns:
+            bool: Returns true if at least one queen was marked.
+        """
+        queen_marked = False
+        for unit_ids, unit_count in [(self.__row_ids, self.height), (self.__col_ids, self.length), (self.color_ids.ravel(), len(self._colors))]:
+            if self.__mark_single_blank_cells(unit_ids, unit_count): queen_marked = True
+        return queen_marked
+
+    def __mark_single_blank_cells(self, unit_ids: np.ndarray, unit_count: int) -> bool:
+        """Go through the units (rows, columns or colorsets - unit_ids has the unit of every cell, by index) in order,
+        and mark the single blank cell of each unit that has one. Counted again after every queen, as the queen crosses cells of later units.
+        """
+        queen_marked = False
+        unit = 0
+        while unit < unit_count:
+            blank = (self.statuses == _BLANK).ravel()
+            blank_counts = np.bincount(unit_ids[blank], minlength=unit_count)
+            singles = np.flatnonzero(blank_counts[unit:] == 1)
+            if len(singles) == 0: break
+            unit += int(singles[0])
+            index = int(np.flatnonzero(blank & (unit_ids == unit))[0])
+            self._Board__mark_queen(self._cells[index]) # Board's own, it goes through set_cell_status
+            queen_marked = True
+            unit += 1
+        return queen_marked
+
+    def would_cell_block_color_set(self, cell: Cell) -> bool:
+        """Assuming a cell is a Queen, would it block any other color set completely? See Board.would_cell_block_color_set
+        """
+        blank = (self.statuses == _BLANK).ravel()
+        color_ids = self.color_ids.ravel()
+        blank_counts = np.bincount(color_ids[blank], minlength=len(self._colors))
+        left_counts = np.bincount(color_ids[blank & ~self.__get_block_arrays()[self.get_index_of(cell)]], minlength=len(self._colors))
+        blocked = (blank_counts > 0) & (left_counts == 0)
+        blocked[self.color_ids[cell.y, cell.x]] = False
+        return bool(blocked.any())
+
+    def __get_block_arrays(self) -> np.ndarray:
+        """get_block_masks as a boolean array - row i is the cells cell i would block. Built on first use."""
+        if self._block_arrays is None:
+            cell_count = self.length * self.height
+            byte_count = (cell_count + 7) // 8
+            self._block_arrays = np.array([
+                np.unpackbits(np.frombuffer(mask.to_bytes(byte_count, 'little'), dtype=np.uint8), count=cell_count, bitorder='little')
+                for mask in self.get_block_masks()
+            ], dtype=bool)
+        return self._block_arrays
+
+    def is_game_over(self) -> bool:
+        return int(np.count_nonzero(self.statuses == _QUEEN)) == self.height
+
+    def get_blank_cells(self) -> list[Cell]:
+        return [self._cells[i] for i in np.flatnonzero(self.statuses == _BLANK)]
+
+    def colorset_axis_holdings(self, axis: str) -> dict[str, frozenset[int]]:
+        """Returns dictionary mapping color to the set of rows or columns held by it. See Board.colorset_axis_holdings
+
+        Also refreshes the holdings of the color sets, like Board does.
+        """
+        ys, xs = np.nonzero(self.statuses == _BLANK)
+        color_ids = self.color_ids[ys, xs]
+        held_rows = np.zeros((len(self._colors), self.height), dtype=bool); held_rows[color_ids, ys] = True
+        held_cols = np.zeros((len(self._colors), self.length), dtype=bool); held_cols[color_ids, xs] = True
+
+        if axis == 'row': held = held_rows
+        elif axis == 'col': held = held_cols
+        else: raise Exception()
+
+        colorset_axis_holdings = {}
+        for color_id, color in enumerate(self._colors):
+            color_set = self.color_sets[color]
+            color_set._held_rows = set(np.flatnonzero(held_rows[color_id]).tolist())
+            color_set._held_cols = set(np.flatnonzero(held_cols[color_id]).tolist())
+            colorset_axis_holdings[color] = frozenset(np.flatnonzero(held[color_id]).tolist())
+        return colorset_axis_holdings
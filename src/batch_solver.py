@@ -0,0 +1,190 @@
+from copy import deepcopy
+
+import numpy as np
+
+from src.matching import prune_holdings
+from src.queens_board import Board, CellStatus
+from src.solving_logic import SolvingLogic
+
+
+class BatchSolver:
+    """Solves many boards of the same size together. The boards are stacked into arrays (board x row x column), and queen marking,
+    axiom 1 (without thinking ahead) and axiom 2 are applied to all of them at once with array operations, until they can't change any board.
+    Only the boards that are not solved by then go on to SolvingLogic.auto_solve one by one (to think ahead).
+
+    Needs NumPy, which is optional - import this module only if you want it.
+
+    A board solved by the array rules ends up exactly as auto_solve would leave it (the queens and everything else crossed).
+    A board that gets stuck may end up with different crosses, as thinking ahead crosses the first cell it finds.
+    """
+
+    BATCH_SIZE = 256
+    """Boards stacked at a time, to keep the arrays (board x color x row x column for axiom 1) small"""
+
+    @staticmethod
+    def solve(boards: list[Board], use_bitboard: bool = True, workers: int = 1) -> list[list[list[str]]]:
+        """Solve the boards. They must all be the same size. The boards themselves are not changed (writing the statuses back to the cells
+        would take longer than solving) - only copies of the ones that go on to auto_solve.
+
+        use_bitboard and workers are passed on to auto_solve for the boards the array rules can't finish.
+
+        Returns:
+            list[list[list[str]]]: The status grid of each board (see Board.to_status_grid), in the same order.
+        """
+        if len({(board.height, board.length) for board in boards}) > 1: raise ValueError("The boards must all be the same size")
+
+        status_grids = []
+        for start in range(0, len(boards), BatchSolver.BATCH_SIZE):
+            batch = boards[start:start + BatchSolver.BATCH_SIZE]
+            blank, queen, valid = BatchSolver._propagate(*BatchSolver._stack(batch))
+            solved = valid & (queen.sum(axis=(1, 2)) == batch[0].height)
+
+            grids = np.where(queen, CellStatus.QUEEN.value, np.where(blank, CellStatus.BLANK.value, CellStatus.CROSS.value)).tolist()
+            for b in np.flatnonzero(~solved):
+                board = deepcopy(batch[b])
+                # a contradiction means the board can't be solved - leave it to auto_solve from where it started
+                if valid[b]: BatchSolver._write_back(board, blank[b], queen[b])
+                SolvingLogic.auto_solve(board, use_bitboard, workers)
+                grids[b] = board.to_status_grid()
+            status_grids.extend(grids)
+
+        return status_grids
+
+    @staticmethod
+    def _stack(boards: list[Board]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The colors (as the index of each cell's colorset), blank cells and queens of the boards, as (board x row x column) arrays."""
+        colors = []; blank = []; queen = []
+        for board in boards:
+            color_ids = {color_set.color_id: i for i, color_set in enumerate(board.color_sets.values())}
+            colors.append([[color_ids[cell.color_id] for cell in row] for row in board.cell_grid])
+            blank.append([[cell.status == CellStatus.BLANK for cell in row] for row in board.cell_grid])
+            queen.append([[cell.status == CellStatus.QUEEN for cell in row] for row in board.cell_grid])
+        return np.array(colors, dtype=np.int16), np.array(blank, dtype=bool), np.array(queen, dtype=bool)
+
+    @staticmethod
+    def _write_back(board: Board, blank: np.ndarray, queen: np.ndarray):
+        for row in board.cell_grid:
+            for cell in row:
+                if queen[cell.y, cell.x]: board.set_cell_status(cell, CellStatus.QUEEN)
+                elif not blank[cell.y, cell.x]: board.set_cell_status(cell, CellStatus.CROSS)
+
+    @staticmethod
+    def _propagate(colors: np.ndarray, blank: np.ndarray, queen: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Queen marking and axiom 1 on all the boards until they change nothing, then axiom 2 on the boards they got stuck on, and so on.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: blank, queen and whether each board is still valid
+            (no row/column/colorset with 2 queens, or without a queen and blank cells).
+        """
+        blank = blank.copy(); queen = queen.copy()
+        color_count = int(colors.max()) + 1
+        color_cells = colors[:, None, :, :] == np.arange(color_count)[None, :, None, None] # board x color x row x column
+        valid = np.ones(len(blank), dtype=bool)
+        active = np.arange(len(blank)) # the boards that may still change
+
+        while len(active):
+            b_color_cells = color_cells[active]
+            b_blank = blank[active]; b_queen = queen[active]
+
+            BatchSolver._mark_queens(b_color_cells, b_blank, b_queen)
+            BatchSolver._axiom_1(b_color_cells, b_blank)
+            changed = (b_blank != blank[active]).any(axis=(1, 2))
+            # the (Python) matching of axiom 2 only for the boards the array rules are stuck on
+            stuck = np.flatnonzero(~changed)
+            if len(stuck):
+                stuck_blank = b_blank[stuck]
+                BatchSolver._axiom_2(b_color_cells[stuck], stuck_blank)
+                changed[stuck] = (stuck_blank != b_blank[stuck]).any(axis=(1, 2))
+                b_blank[stuck] = stuck_blank
+
+            blank[active] = b_blank; queen[active] = b_queen
+            b_valid = BatchSolver._is_valid(b_color_cells, b_blank, b_queen)
+            valid[active] = b_valid
+            active = active[changed & b_valid]
+
+        return blank, queen, valid
+
+    @staticmethod
+    def _mark_queens(color_cells: np.ndarray, blank: np.ndarray, queen: np.ndarray):
+        """Mark the single blank cell of every row, column and colorset as a queen, and cross the cells the queens block. In place."""
+        color_blank_counts = (color_cells & blank[:, None]).sum(axis=(2, 3)) # board x color
+        single = blank & (
+            (blank.sum(axis=2) == 1)[:, :, None]
+            | (blank.sum(axis=1) == 1)[:, None, :]
+            | ((color_blank_counts == 1)[:, :, None, None] & color_cells).any(axis=1)
+        )
+        if not single.any(): return
+        queen |= single
+
+        blocked = queen.any(axis=2)[:, :, None] | queen.any(axis=1)[:, None, :] # same row or column
+        blocked = blocked | ((color_cells & queen[:, None]).any(axis=(2, 3))[:, :, None, None] & color_cells).any(axis=1) # same color
+        padded = np.pad(queen, ((0, 0), (1, 1), (1, 1)))
+        height, length = queen.shape[1:]
+        for dy, dx in [(0, 0), (0, 2), (2, 0), (2, 2)]: # diagonally adjacent
+            blocked |= padded[:, dy:dy + height, dx:dx + length]
+        blank &= ~(blocked | queen)
+
+    @staticmethod
+    def _axiom_1(color_cells: np.ndarray, blank: np.ndarray):
+        """Cross the blank cells that, if they were queens, would block all the blank cells of another colorset. In place.
+
+        For every cell and colorset, the colorset's blank cells on the cell's row and column and diagonally next to it are counted at once.
+        If that's all of them, the cell would block the colorset.
+        """
+        color_blank = (color_cells & blank[:, None]).astype(np.int16) # board x color x row x column
+        totals = color_blank.sum(axis=(2, 3))
+        covered = color_blank.sum(axis=3)[:, :, :, None] + color_blank.sum(axis=2)[:, :, None, :] - color_blank
+        padded = np.pad(color_blank, ((0, 0), (0, 0), (1, 1), (1, 1)))
+        height, length = blank.shape[1:]
+        for dy, dx in [(0, 0), (0, 2), (2, 0), (2, 2)]: # diagonally adjacent
+            covered += padded[:, :, dy:dy + height, dx:dx + length]
+
+        blocks = (covered == totals[:, :, None, None]) & (totals > 0)[:, :, None, None] & ~color_cells
+        blank &= ~blocks.any(axis=1)
+
+    @staticmethod
+    def _axiom_2(color_cells: np.ndarray, blank: np.ndarray):
+        """Axiom 2 on the rows and columns of every board (see SolvingLogic._axiom_2_on_axis). In place.
+
+        The holdings are gathered with array operations. The matching itself (prune_holdings) is done board by board on bitmasks.
+        """
+        for axis in [3, 2]: # rows (any cell along the columns), then columns
+            color_blank = color_cells & blank[:, None]
+            held = color_blank.any(axis=axis) # board x color x row/column
+            holdings = (held.astype(np.int64) << np.arange(held.shape[2], dtype=np.int64)).sum(axis=2).tolist()
+
+            unusable = np.zeros(held.shape, dtype=bool)
+            for b, board_holdings in enumerate(holdings):
+                color_ids = [color_id for color_id, held_mask in enumerate(board_holdings) if held_mask] # colorsets with a queen hold nothing
+                pruned = prune_holdings([board_holdings[color_id] for color_id in color_ids])
+                if pruned is None: continue # can't be solved from here, leave that to the other rules
+                for color_id, kept in zip(color_ids, pruned):
+                    removed = board_holdings[color_id] & ~kept
+                    while removed:
+                        low_bit = removed & -removed
+                        unusable[b, color_id, low_bit.bit_length() - 1] = True
+                        removed ^= low_bit
+
+            if axis == 3: unusable_cells = unusable[:, :, :, None] & color_cells
+            else: unusable_cells = unusable[:, :, None, :] & color_cells
+            blank &= ~unusable_cells.any(axis=1)
+
+    @staticmethod
+    def _is_valid(color_cells: np.ndarray, blank: np.ndarray, queen: np.ndarray) -> np.ndarray:
+        """Per board: no row, column or colorset has 2 queens, or neither a queen nor a blank cell, and no 2 queens touch diagonally."""
+        valid = np.ones(len(blank), dtype=bool)
+        color_queen_counts = (color_cells & queen[:, None]).sum(axis=(2, 3))
+        color_blank_counts = (color_cells & blank[:, None]).sum(axis=(2, 3))
+        has_cells = color_cells.any(axis=(2, 3)) # padding colors (boards with fewer colorsets) don't count
+        for queen_counts, blank_counts, units in [
+            (queen.sum(axis=2), blank.sum(axis=2), None),
+            (queen.sum(axis=1), blank.sum(axis=1), None),
+            (color_queen_counts, color_blank_counts, has_cells),
+        ]:
+            bad = (queen_counts > 1) | ((queen_counts == 0) & (blank_counts == 0))
+            if units is not None: bad &= units
+            valid &= ~bad.any(axis=1)
+        # queens next to each other on a row or column are already 2 on it, so only the diagonals are left
+        touching = (queen[:, 1:, 1:] & queen[:, :-1, :-1]) | (queen[:, 1:, :-1] & queen[:, :-1, 1:])
+        valid &= ~touching.any(axis=(1, 2))
+        return valid
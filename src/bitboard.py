@@ -0,0 +1,360 @@
+import threading
+
+from src.matching import prune_holdings
+from src.queens_board import Board, Cell, CellStatus, _layout_masks, bit_indices, check_cancelled
+from src.transposition_table import TranspositionTable
+
+
+class BitBoard:
+    """Integer bitmask engine for a Board.
+
+    Each cell gets a bit index: index = x + length * y (i.e. book reading order - left to right, top to bottom).
+    The rows, columns, colorsets and the blank/queen state of the board are held as integers, where bit i represents cell i.
+    So a blocking test or a "does this colorset have any blank cell left" test is just a few AND/OR operations.
+
+    Changes made through this object (queens marked, cells crossed) are written through to the Board it was made from (so they are also on its trail),
+    so the Board stays the source of truth for to_status_grid(), the GUI etc.
+    Don't change cell statuses behind its back while it is in use.
+    """
+
+    board: Board
+    """The Board this engine reads from and writes through to"""
+    length: int
+    height: int
+    cell_grid: list[list[Cell]]
+    """Same list as board.cell_grid"""
+
+    _cells: list[Cell]
+    """Cells by bit index"""
+    _row_masks: list[int]
+    _col_masks: list[int]
+    _colors: list[str]
+    """Colors of the colorsets, in the same order as board.color_sets"""
+    _color_masks: list[int]
+    """Cells of each colorset, same order as _colors"""
+    _cell_color_ids: list[int]
+    """Index into _colors for every cell (by bit index)"""
+    _units: list[int]
+    """Rows, columns and colorsets - each of them must end up with exactly one queen"""
+    _block_masks: list[int]
+    """For every cell (by bit index), the cells it would block if it were a queen. Does not include the cell itself. Shared with the board (see Board.get_block_masks)"""
+    _blank: int
+    _queens: int
+
+    transposition_table: TranspositionTable
+    """Memo for would_cell_block_color_set_n. Keyed on the blank mask, which is the whole state that matters for it, so it stays valid as the board changes."""
+
+    def __init__(self, board: Board):
+        self.board = board
+        self.length = board.length
+        self.height = board.height
+        self.cell_grid = board.cell_grid
+
+        self._cells = [cell for row in board.cell_grid for cell in row]
+
+        self._row_masks, self._col_masks, _ = _layout_masks(self.length, self.height)
+
+        self._colors = list(board.color_sets.keys())
+        color_ids = {color_set.color_id: i for i, color_set in enumerate(board.color_sets.values())}
+        self._color_masks = [0] * len(self._colors)
+        self._cell_color_ids = []
+        self._blank = 0; self._queens = 0
+        for i, cell in enumerate(self._cells):
+            color_id = color_ids[cell.color_id]
+            self._cell_color_ids.append(color_id)
+            self._color_masks[color_id] |= 1 << i
+            if cell.status == CellStatus.BLANK: self._blank |= 1 << i
+            elif cell.status == CellStatus.QUEEN: self._queens |= 1 << i
+
+        self._units = self._row_masks + self._col_masks + self._color_masks
+        self._block_masks = board.get_block_masks()
+        self.transposition_table = TranspositionTable()
+
+    def _index_of(self, cell: Cell) -> int:
+        return cell.x + self.length * cell.y
+
+    def cross_cell(self, cell: Cell):
+        """Mark a cell as unable to be a queen."""
+        self._blank &= ~(1 << self._index_of(cell))
+        self.board.cross_cell(cell)
+
+    def __mark_queen(self, index: int):
+        """Mark a cell as a queen. Cross out all the blank cells it would block
+        """
+        self.board.set_cell_status(self._cells[index], CellStatus.QUEEN)
+        self._queens |= 1 << index
+
+        to_cross = self._blank & self._block_masks[index]
+        for i in bit_indices(to_cross):
+            self.board.cross_cell(self._cells[i])
+        self._blank &= ~(to_cross | (1 << index))
+
+    def mark_queens_where_certain(self) -> bool:
+        """Mark queens on the board where certain. Same order of checks as Board.mark_queens_where_certain.
+
+        Returns:
+            bool: Returns true if at least one queen was marked.
+        """
+        queen_marked = False
+        for masks in [self._row_masks, self._col_masks, self._color_masks]:
+            for mask in masks:
+                blanks = self._blank & mask
+                if blanks and blanks & (blanks - 1) == 0: # exactly one blank cell
+                    self.__mark_queen(blanks.bit_length() - 1)
+                    queen_marked = True
+        return queen_marked
+
+    def get_unit_count(self) -> int:
+        """Number of units - i.e. rows, columns and colorsets. Unit ids go from 0 to this - 1."""
+        return len(self._units)
+
+    def get_unit_ids_of(self, cell: Cell) -> tuple[int, int, int]:
+        """Unit ids of the row, column and colorset of the cell."""
+        return (cell.y, self.height + cell.x, self.height + self.length + self._cell_color_ids[self._index_of(cell)])
+
+    def get_color_count(self) -> int:
+        """Number of colorsets. Color ids go from 0 to this - 1, in the same order as board.color_sets."""
+        return len(self._colors)
+
+    def get_color_id_of(self, cell: Cell) -> int:
+        return self._cell_color_ids[self._index_of(cell)]
+
+    def mark_queen_if_single_blank(self, unit_id: int) -> bool:
+        """If the unit (row, column or colorset) has only one blank cell, mark it as a queen.
+
+        Returns:
+            bool: If a queen was marked.
+        """
+        blanks = self._blank & self._units[unit_id]
+        if blanks and blanks & (blanks - 1) == 0: # exactly one blank cell
+            self.__mark_queen(blanks.bit_length() - 1)
+            return True
+        return False
+
+    def cross_cells_blocking_colorset(self, color_id: int) -> bool:
+        """Axiom 1 (without thinking ahead) for a single colorset. Crosses out the blank cells that, if were a queen, would block all the blank cells of the colorset.
+
+        Those are the cells that every blank cell of the colorset would block (a cell blocks another if and only if the other blocks it).
+
+        Returns:
+            bool: If any cell was crossed.
+        """
+        color_blanks = self._blank & self._color_masks[color_id]
+        if not color_blanks: return False
+
+        blocking = -1
+        for i in bit_indices(color_blanks):
+            blocking &= self._block_masks[i]
+            if not blocking: return False
+        blocking &= self._blank
+
+        for i in bit_indices(blocking):
+            self.cross_cell(self._cells[i])
+        return blocking != 0
+
+    def is_game_over(self) -> bool:
+        """If all the Queens have been found."""
+        return bin(self._queens).count("1") == self.height
+
+    def get_blank_cells(self) -> list[Cell]:
+        return [self._cells[i] for i in bit_indices(self._blank)]
+
+    def _would_block(self, blank: int, index: int) -> bool:
+        """would_cell_block_color_set for the cell at index, on a board whose blank cells are given by blank."""
+        unblocked = blank & ~self._block_masks[index]
+        own_color_id = self._cell_color_ids[index]
+        for color_id, color_mask in enumerate(self._color_masks):
+            if color_id == own_color_id: continue
+            if blank & color_mask and not unblocked & color_mask: return True
+        return False
+
+    def _would_block_n(self, blank: int, index: int, n: int, cancel: threading.Event | None = None) -> bool:
+        """would_cell_block_color_set_n for the cell at index, on a board whose blank cells are given by blank.
+
+        As the only state that matters here is the blank mask, no board copies are needed to look ahead.
+        Results for n >= 2 are memoized in the transposition table. cancel is checked at every step with n >= 2 (raises SolveCancelled).
+        """
+        if n == 1: return self._would_block(blank, index)
+
+        check_cancelled(cancel)
+        key = (blank, index, n)
+        result = self.transposition_table.get(key)
+        if result is None:
+            result = self.__would_block_n(blank, index, n, cancel)
+            self.transposition_table.put(key, result)
+        return result
+
+    def __would_block_n(self, blank: int, index: int, n: int, cancel: threading.Event | None = None) -> bool:
+        """_would_block_n without the transposition table"""
+        if self._would_block(blank, index): return True
+
+        # mark the cell as queen
+        blank &= ~(self._block_masks[index] | (1 << index))
+
+        # if in at least one color set, all the blank cells would block, return True
+        for color_mask in self._color_masks:
+            color_blanks = blank & color_mask
+            if not color_blanks: continue
+            if all(self._would_block_n(blank, i, n-1, cancel) for i in bit_indices(color_blanks)): return True
+        return False
+
+    def get_lookahead_state(self) -> tuple[list[int], list[int], list[int], int]:
+        """Everything would_cell_block_color_set_n needs, in a compact picklable form (just ints), e.g. to send to another process.
+
+        See from_lookahead_state.
+        """
+        return (self._color_masks, self._cell_color_ids, self._block_masks, self._blank)
+
+    @classmethod
+    def from_lookahead_state(cls, state: tuple[list[int], list[int], list[int], int]) -> 'BitBoard':
+        """Make a BitBoard from get_lookahead_state(). There is no Board behind it, so it can only be used for would_index_block_color_set_n.
+        """
+        bitboard = cls.__new__(cls)
+        bitboard._color_masks, bitboard._cell_color_ids, bitboard._block_masks, bitboard._blank = state
+        bitboard.transposition_table = TranspositionTable()
+        return bitboard
+
+    @classmethod
+    def from_color_masks(cls, length: int, height: int, color_masks: list[int], blank: int, queens: int = 0) -> 'BitBoard':
+        """Make a BitBoard straight from bitmasks, without a Board (building a Board is the slow part when checking thousands of layouts - e.g. the puzzle generator).
+        There is no Board behind it, so it can only be used for the search (find_solutions).
+
+        Args:
+            color_masks (list[int]): The cells of each colorset. Cells not in any colorset must not be blank.
+            blank (int): The blank cells. Blank cells blocked by the queens are crossed out.
+            queens (int, optional): The queens. Defaults to 0 (none).
+        """
+        bitboard = cls.__new__(cls)
+        bitboard.length = length; bitboard.height = height
+        bitboard._row_masks, bitboard._col_masks, layout_block_masks = _layout_masks(length, height)
+        bitboard._color_masks = color_masks
+        bitboard._units = bitboard._row_masks + bitboard._col_masks + color_masks
+
+        cell_color_masks = [0] * (length * height)
+        for color_mask in color_masks:
+            for i in bit_indices(color_mask): cell_color_masks[i] = color_mask
+        bitboard._block_masks = [
+            (layout_mask | color_mask) & ~(1 << i) for i, (layout_mask, color_mask) in enumerate(zip(layout_block_masks, cell_color_masks))
+        ]
+
+        for i in bit_indices(queens): blank &= ~(bitboard._block_masks[i] | (1 << i))
+        bitboard._blank = blank; bitboard._queens = queens
+        bitboard.transposition_table = TranspositionTable()
+        return bitboard
+
+    def would_index_block_color_set_n(self, index: int, n: int) -> bool:
+        """would_cell_block_color_set_n for the cell at the bit index"""
+        return self._would_block_n(self._blank, index, n)
+
+    def would_cell_block_color_set(self, cell: Cell) -> bool:
+        """Assuming a cell is a Queen, would it block any other color set completely?
+        """
+        return self._would_block(self._blank, self._index_of(cell))
+
+    def would_cell_block_color_set_n(self, cell: Cell, n: int, cancel: threading.Event | None = None) -> bool:
+        """Assuming a cell is a Queen, would it block any other color set completely? Checks n moves ahead.
+
+        See Board.would_cell_block_color_set_n
+        """
+        return self._would_block_n(self._blank, self._index_of(cell), n, cancel)
+
+    def colorset_axis_holdings(self, axis: str) -> dict[str, frozenset[int]]:
+        """Returns dictionary mapping color to the set of rows or columns held by it.
+
+        Args:
+            axis (str): 'row' or 'col'
+
+        Raises:
+            Exception: If you enter something other than 'row' or 'col' for the axis argument.
+
+        Returns:
+            dict[str, frozenset[int]]: Dictionary mapping color to the set of rows or columns held by it.
+        """
+        if axis == 'row': axis_masks = self._row_masks
+        elif axis == 'col': axis_masks = self._col_masks
+        else: raise Exception()
+
+        colorset_axis_holdings = {}
+        for color, color_mask in zip(self._colors, self._color_masks):
+            color_blanks = self._blank & color_mask
+            colorset_axis_holdings[color] = frozenset(i for i, axis_mask in enumerate(axis_masks) if color_blanks & axis_mask)
+        return colorset_axis_holdings
+
+    def _prune_colorset_holdings(self, blank: int, queens: int, axis_masks: list[int]) -> int | None:
+        """Crosses out the blank cells of the colorsets without a queen on rows (or columns) that are not part of any perfect matching
+        of the colorsets and the rows/columns they hold. See prune_holdings.
+
+        Returns:
+            int | None: The new blank mask, or None if there is no perfect matching (i.e. this is a dead end).
+        """
+        color_masks = [color_mask for color_mask in self._color_masks if not queens & color_mask]
+        holdings: list[int] = [] # per colorset without a queen, bitmask of the rows/columns held
+        for color_mask in color_masks:
+            color_blanks = blank & color_mask
+            held = 0
+            for i, axis_mask in enumerate(axis_masks):
+                if color_blanks & axis_mask: held |= 1 << i
+            holdings.append(held)
+
+        pruned = prune_holdings(holdings)
+        if pruned is None: return None
+        for color_mask, held, kept in zip(color_masks, holdings, pruned):
+            for i in bit_indices(held & ~kept): blank &= ~(color_mask & axis_masks[i])
+        return blank
+
+    def _search(self, blank: int, queens: int, cancel: threading.Event | None = None):
+        """Backtracking search for complete solutions. Yields the queens bitmask of every solution found. cancel is checked at every node (raises SolveCancelled).
+
+        Picks the row, column or colorset with the fewest blank cells left (the most constrained) and tries each of them as a queen.
+        A row/column/colorset without a queen and without blank cells means a dead end.
+        Before that, crosses out the cells _prune_colorset_holdings can rule out (until it can't rule out any more), which cuts off almost all dead ends early.
+        """
+        check_cancelled(cancel)
+        while True:
+            old_blank = blank
+            for axis_masks in [self._row_masks, self._col_masks]:
+                blank = self._prune_colorset_holdings(blank, queens, axis_masks)
+                if blank is None: return # dead end
+            if blank == old_blank: break
+        best_candidates = 0; best_count = 0
+        for unit in self._units:
+            if queens & unit: continue
+            candidates = blank & unit
+            if not candidates: return # dead end
+            count = candidates.bit_count()
+            if best_count == 0 or count < best_count:
+                best_candidates = candidates; best_count = count
+                if count == 1: break # can't do better than this
+
+        if best_count == 0: # every row, column and colorset has a queen
+            yield queens
+            return
+
+        for i in bit_indices(best_candidates):
+            yield from self._search(blank & ~(self._block_masks[i] | (1 << i)), queens | (1 << i), cancel)
+
+    def find_solutions(self, limit: int, cancel: threading.Event | None = None) -> list[int]:
+        """Find up to limit solutions with the backtracking search. Stops searching as soon as the limit is reached. See _search (cancel).
+
+        Returns:
+            list[int]: The queens bitmask of each solution found, in the order found.
+        """
+        solutions = []
+        for solution in self._search(self._blank, self._queens, cancel):
+            solutions.append(solution)
+            if len(solutions) >= limit: break
+        return solutions
+
+    def solve(self, cancel: threading.Event | None = None) -> bool:
+        """Solve the board completely with a backtracking search. Unlike the axioms this always finishes (unless cancelled - see _search).
+
+        Marks the queens of the first solution found (which also crosses out every other cell).
+
+        Returns:
+            bool: False if the board has no solution. The board is left unchanged in that case.
+        """
+        solution = next(self._search(self._blank, self._queens, cancel), None)
+        if solution is None: return False
+        for i in bit_indices(solution & ~self._queens):
+            self.__mark_queen(i)
+        return True
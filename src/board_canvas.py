@@ -0,0 +1,66 @@
+import tkinter as tk
+
+from src.queens_board import Board, CellStatus
+
+
+class BoardCanvas:
+    """Draws a Board on a single tk.Canvas - a rectangle and a text item per cell - instead of a widget per cell.
+
+    The Board is the source of truth. After draw_board, only the cells that change need redrawing (draw_cell_color / draw_cell_status).
+    """
+
+    CELL_SIZE = 36
+    """Width and height of a cell, in pixels"""
+    CELL_GAP = 4
+    """Spacing between cells, in pixels"""
+    BORDER_WIDTH = 2
+
+    canvas: tk.Canvas
+    size: int
+    """Cells per row (and column)"""
+    _rectangles: list[int]
+    """Canvas item id of each cell's rectangle, in grid order (index = x + size * y)"""
+    _texts: list[int]
+    """Canvas item id of each cell's text (the status), in grid order"""
+
+    def __init__(self, parent: tk.Misc):
+        self.canvas = tk.Canvas(parent, width=0, height=0, highlightthickness=0)
+        self.size = 0
+        self._rectangles = []
+        self._texts = []
+
+    def draw_board(self, board: Board):
+        """Draw the whole board from scratch (e.g. a new grid)."""
+        self.canvas.delete("all")
+        self.size = board.length
+        self._rectangles = []; self._texts = []
+
+        pitch = self.CELL_SIZE + self.CELL_GAP
+        for row in board.cell_grid:
+            for cell in row:
+                left = self.CELL_GAP // 2 + cell.x * pitch
+                top = self.CELL_GAP // 2 + cell.y * pitch
+                self._rectangles.append(self.canvas.create_rectangle(
+                    left, top, left + self.CELL_SIZE, top + self.CELL_SIZE,
+                    fill=cell.color, outline="black", width=self.BORDER_WIDTH
+                ))
+                self._texts.append(self.canvas.create_text(
+                    left + self.CELL_SIZE // 2, top + self.CELL_SIZE // 2,
+                    text=cell.status.value, fill="black"
+                ))
+        self.canvas.config(width=self.size * pitch, height=board.height * pitch)
+
+    def draw_cell_color(self, x: int, y: int, color: str):
+        self.canvas.itemconfigure(self._rectangles[x + self.size * y], fill=color)
+
+    def draw_cell_status(self, x: int, y: int, status: CellStatus):
+        self.canvas.itemconfigure(self._texts[x + self.size * y], text=status.value)
+
+    def cell_at(self, pixel_x: int, pixel_y: int) -> tuple[int, int] | None:
+        """(x, y) of the cell at a point on the canvas (e.g. a mouse click). None if it's not on a cell (e.g. in the gap between cells)."""
+        pitch = self.CELL_SIZE + self.CELL_GAP
+        x, x_offset = divmod(pixel_x - self.CELL_GAP // 2, pitch)
+        y, y_offset = divmod(pixel_y - self.CELL_GAP // 2, pitch)
+        if not (0 <= x < self.size and 0 <= y < self.size): return None
+        if x_offset >= self.CELL_SIZE or y_offset >= self.CELL_SIZE: return None
+        return x, y
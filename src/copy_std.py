@@ -1,13 +1,76 @@
 import sys
+import threading
 from typing import TextIO
 
 import tkinter as tk
 
 
+class TextWidgetBuffer:
+    """Collects text for a tk.Text widget and adds it to the widget in batches, on a timer (every FLUSH_MS).
+
+    Inserting into the widget on every write means a Tk relayout per print, which slows down long solves.
+    write() can be called from any thread - only the timer (on the Tk thread) touches the widget.
+    Only the last MAX_LINES lines are kept in the widget - and in the collected text, so a fast solve can't pile up text between flushes.
+    """
+
+    FLUSH_MS = 50
+    """How often the collected text is added to the widget"""
+    MAX_LINES = 1000
+    """Older lines are removed from the widget"""
+
+    text_widget: tk.Text
+    _pending: list[str]
+    """Text written since the last flush"""
+    _pending_lines: int
+    """Line breaks in _pending"""
+    _lock: threading.Lock
+
+    def __init__(self, text_widget: tk.Text):
+        """Call from the Tk thread."""
+        self.text_widget = text_widget
+        self._pending = []
+        self._pending_lines = 0
+        self._lock = threading.Lock()
+        self.text_widget.after(self.FLUSH_MS, self.__flush_on_timer)
+
+    def write(self, string: str):
+        with self._lock:
+            self._pending.append(string)
+            self._pending_lines += string.count("\n")
+            # trimmed once it's twice over the limit, so joining the text doesn't happen on every write
+            if self._pending_lines > 2 * self.MAX_LINES: self.__trim_pending()
+
+    def __trim_pending(self):
+        """Keep only the last MAX_LINES lines of the collected text - the widget would drop the rest anyway. Call with the lock held."""
+        lines = "".join(self._pending).split("\n") # the last one is the line being written (without a line break yet)
+        self._pending = ["\n".join(lines[-(self.MAX_LINES + 1):])]
+        self._pending_lines = min(len(lines) - 1, self.MAX_LINES)
+
+    def flush(self):
+        """Add the collected text to the widget now. Call from the Tk thread."""
+        with self._lock:
+            if not self._pending: return
+            text = "".join(self._pending)
+            self._pending = []
+            self._pending_lines = 0
+
+        self.text_widget.insert(tk.END, text)
+        line_count = int(self.text_widget.index("end-1c").split(".")[0])
+        if line_count > self.MAX_LINES:
+            self.text_widget.delete("1.0", f"{line_count - self.MAX_LINES + 1}.0")
+        self.text_widget.see(tk.END)
+
+    def __flush_on_timer(self):
+        try:
+            self.flush()
+            self.text_widget.after(self.FLUSH_MS, self.__flush_on_timer)
+        except tk.TclError: pass # the widget is gone
+
+
 class STDOutHandler:
     """Class to handle stdout.
 
-    This copies the stdout to the provided tk.Text widget.
+    This copies the stdout to the provided tk.Text widget (through a TextWidgetBuffer, so it's cheap and can be used from any thread).
     """
 
     text_widget: tk.Text
@@ -18,18 +81,24 @@ class STDOutHandler:
     """Reference to the real stdout
     """
 
-    def __init__(self, text_widget: tk.Text):
+    buffer: TextWidgetBuffer
+
+    def __init__(self, text_widget: tk.Text, buffer: TextWidgetBuffer | None = None):
+        """
+        Args:
+            buffer (TextWidgetBuffer | None, optional): Share one with the STDErrHandler of the same widget, to keep the output in order. Defaults to None (a new one).
+        """
         self.text_widget = text_widget
         self.actual_stdout = sys.stdout
+        self.buffer = buffer or TextWidgetBuffer(text_widget)
 
     # Method to stick to protocol
     def write(self, string: str):
         # Print to real terminal
         self.actual_stdout.write(string)
 
-        # Copy to tkinter text widget
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
+        # Copy to tkinter text widget (soon)
+        self.buffer.write(string)
 
     # Method to stick to protocol
     def flush(self):
@@ -38,7 +107,7 @@ class STDOutHandler:
 class STDErrHandler:
     """Class to handle stderr.
 
-    This copies the stderr to the provided tk.Text widget.
+    This copies the stderr to the provided tk.Text widget (through a TextWidgetBuffer, so it's cheap and can be used from any thread).
     """
 
     text_widget: tk.Text
@@ -49,19 +118,25 @@ class STDErrHandler:
     """Reference to the real stderr
     """
 
-    def __init__(self, text_widget: tk.Text):
+    buffer: TextWidgetBuffer
+
+    def __init__(self, text_widget: tk.Text, buffer: TextWidgetBuffer | None = None):
+        """
+        Args:
+            buffer (TextWidgetBuffer | None, optional): Share one with the STDOutHandler of the same widget, to keep the output in order. Defaults to None (a new one).
+        """
         self.text_widget = text_widget
         self.actual_stderr = sys.stderr
+        self.buffer = buffer or TextWidgetBuffer(text_widget)
 
     # Method to stick to protocol
     def write(self, string: str):
         # Print to real terminal
         self.actual_stderr.write(string)
 
-        # Copy to tkinter text widget
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)
+        # Copy to tkinter text widget (soon)
+        self.buffer.write(string)
 
     # Method to stick to protocol
     def flush(self):
-        self.actual_stderr.flush()
\ No newline at end of file
+        self.actual_stderr.flush()
@@ -0,0 +1,183 @@
+import mmap
+import os
+import struct
+from typing import BinaryIO
+
+from src.queens_board import Board, CellStatus
+
+
+# File layout (all little-endian):
+#   header: magic b"QNSC", version (u16), reserved (u16), puzzle count (u32), offset of the index (u64)
+#   records, one per puzzle:
+#       rows (u8), cols (u8), color count (u8), flags (u8 - bit 0: has a solution), name length (u16), name (utf-8)
+#       palette: per color, length (u8) and the color as in the json (utf-8), e.g. "#80ffff" or "SystemButtonFace"
+#       color ids: rows * cols bytes, in reading order (index = x + cols * y), each an index into the palette
+#       solution (if the flag is set): queens bitmap, then blanks bitmap (ceil(rows * cols / 8) bytes each, bit i = cell i). Other cells are crossed.
+#   index: the offset of every record (u64 each)
+_MAGIC = b"QNSC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHIQ")
+_RECORD_HEADER = struct.Struct("<BBBBH")
+_OFFSET = struct.Struct("<Q")
+_HAS_SOLUTION = 1
+
+
+class CorpusPuzzle:
+    """One puzzle of a corpus file - what a puzzle json file and its truth pickle hold."""
+
+    name: str
+    """e.g. the json file name without the extension"""
+    puzzle: dict
+    """Same as the json: {"rows": ..., "cols": ..., "colors": [[...], ...]}"""
+    solution: list[list[str]] | None
+    """Status grid (see Board.to_status_grid), if there is one"""
+
+    def __init__(self, name: str, puzzle: dict, solution: list[list[str]] | None = None):
+        self.name = name
+        self.puzzle = puzzle
+        self.solution = solution
+
+    def to_board(self) -> Board:
+        return Board.from_dict(self.puzzle)
+
+
+class CorpusWriter:
+    """Writes puzzles to a corpus file, one at a time (so a corpus doesn't have to fit in memory). Use as a context manager, or call close()."""
+
+    _file: BinaryIO
+    _offsets: list[int]
+
+    def __init__(self, path: str):
+        self._file = open(path, "wb")
+        self._offsets = []
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0, 0)) # filled in by close()
+
+    def add(self, name: str, puzzle: dict, solution: list[list[str]] | None = None):
+        """Add a puzzle (as in the json) and optionally its solution status grid.
+
+        Raises:
+            ValueError: If the puzzle doesn't fit the file layout (more than 255 rows, columns or colors, a color longer than 255 bytes,
+                a name longer than 65535 bytes) or its colors don't match its size.
+        """
+        rows = int(puzzle["rows"]); cols = int(puzzle["cols"])
+        palette: dict[str, int] = {}
+        cell_color_ids = [palette.setdefault(color, len(palette)) for row in puzzle["colors"] for color in row]
+        encoded_name = name.encode()
+        encoded_colors = [color.encode() for color in palette]
+
+        # the sizes are stored in single bytes (the name length in 2), so check them all before encoding anything
+        problems = []
+        if not 0 <= rows <= 255 or not 0 <= cols <= 255: problems.append(f"it is {rows}x{cols}, at most 255x255 fits")
+        if len(palette) > 255: problems.append(f"it has {len(palette)} colors, at most 255 fit")
+        long_colors = [color for color, encoded_color in zip(palette, encoded_colors) if len(encoded_color) > 255]
+        if long_colors: problems.append(f"{len(long_colors)} of its colors (e.g. {long_colors[0][:16]!r}...) are longer than 255 bytes")
+        if len(encoded_name) > 0xFFFF: problems.append("its name is longer than 65535 bytes")
+        if len(cell_color_ids) != rows * cols: problems.append(f"it has {len(cell_color_ids)} cells, expected {rows * cols}")
+        if problems: raise ValueError(f"Puzzle {name} can't be stored in a corpus file: {'; '.join(problems)}")
+
+        record = [_RECORD_HEADER.pack(rows, cols, len(palette), _HAS_SOLUTION if solution is not None else 0, len(encoded_name)), encoded_name]
+        for encoded_color in encoded_colors:
+            record += [bytes([len(encoded_color)]), encoded_color]
+        record.append(bytes(cell_color_ids))
+        if solution is not None:
+            queens = 0; blanks = 0
+            for i, status in enumerate(status for row in solution for status in row):
+                if status == CellStatus.QUEEN.value: queens |= 1 << i
+                elif status == CellStatus.BLANK.value: blanks |= 1 << i
+            bitmap_size = (rows * cols + 7) // 8
+            record += [queens.to_bytes(bitmap_size, "little"), blanks.to_bytes(bitmap_size, "little")]
+
+        self._offsets.append(self._file.tell())
+        self._file.write(b"".join(record))
+
+    def close(self):
+        index_offset = self._file.tell()
+        for offset in self._offsets: self._file.write(_OFFSET.pack(offset))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, 0, len(self._offsets), index_offset))
+        self._file.close()
+
+    def __enter__(self) -> 'CorpusWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CorpusReader:
+    """Reads a corpus file, memory-mapped. Puzzles are only decoded when asked for, so getting puzzle k (corpus[k], or board(k)) is quick
+    however big the file is - nothing else is read.
+
+    Use as a context manager, or call close().
+    """
+
+    path: str
+    _file: BinaryIO
+    _map: mmap.mmap
+    _count: int
+    _index_offset: int
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self._count, self._index_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC: raise ValueError(f"{path} is not a corpus file")
+        if version != _VERSION: raise ValueError(f"{path} is a version {version} corpus file, expected version {_VERSION}")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, k: int) -> CorpusPuzzle:
+        if k < 0: k += self._count
+        if not 0 <= k < self._count: raise IndexError(k)
+        offset = _OFFSET.unpack_from(self._map, self._index_offset + _OFFSET.size * k)[0]
+
+        rows, cols, color_count, flags, name_length = _RECORD_HEADER.unpack_from(self._map, offset)
+        offset += _RECORD_HEADER.size
+        name = self._map[offset:offset + name_length].decode(); offset += name_length
+        palette = []
+        for _ in range(0, color_count):
+            length = self._map[offset]
+            palette.append(self._map[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+        color_ids = self._map[offset:offset + rows * cols]; offset += rows * cols
+        colors = [[palette[color_id] for color_id in color_ids[y * cols:(y + 1) * cols]] for y in range(0, rows)]
+
+        solution = None
+        if flags & _HAS_SOLUTION:
+            bitmap_size = (rows * cols + 7) // 8
+            queens = int.from_bytes(self._map[offset:offset + bitmap_size], "little"); offset += bitmap_size
+            blanks = int.from_bytes(self._map[offset:offset + bitmap_size], "little")
+            solution = []
+            for y in range(0, rows):
+                row = []
+                for i in range(y * cols, (y + 1) * cols):
+                    if queens >> i & 1: row.append(CellStatus.QUEEN.value)
+                    elif blanks >> i & 1: row.append(CellStatus.BLANK.value)
+                    else: row.append(CellStatus.CROSS.value)
+                solution.append(row)
+
+        return CorpusPuzzle(name, {"rows": rows, "cols": cols, "colors": colors}, solution)
+
+    def __iter__(self):
+        for k in range(0, self._count): yield self[k]
+
+    def board(self, k: int) -> Board:
+        """Puzzle k as a Board"""
+        return self[k].to_board()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> 'CorpusReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def is_corpus_file(path: str) -> bool:
+        if not os.path.isfile(path): return False
+        with open(path, "rb") as f: return f.read(len(_MAGIC)) == _MAGIC
@@ -1,28 +1,50 @@
 import sys
 import json
+import sqlite3
+import queue
+import threading
+import traceback
+from typing import Callable
 
 import tkinter as tk
 from tkinter import ttk, colorchooser, filedialog, messagebox
 
-from src.queens_board import Board, Cell, CellStatus
-from src.solving_logic import SolvingLogic
-from src.copy_std import STDOutHandler, STDErrHandler
+from src.board_canvas import BoardCanvas
+from src.queens_board import Board, Cell
+from src.solution_cache import SolutionCache
+from src.solver_events import SolverEvent
+from src.solving_logic import SolutionCount, SolvingLogic, SolveCancelled
+from src.copy_std import STDOutHandler, STDErrHandler, TextWidgetBuffer
 
 
 class GUI:
 
-    gui_cells: list[tk.Label] = []
-    """Holds references to the gui cells. Keep this in grid order (like reading a book from left to right, top to bottom)
-
-    (So that cells can be accessed easily via this convention: gui_cell = self.__gui_cells[x + self.__grid_size * y])
-    """
-
     chosen_color = "white" # initial color
     """Variable to hold the currently chosen color from the color picker.
     """
 
     grid_size: int = 0
-    board: Board
+    board: Board | None = None
+    """The board shown. The source of truth for the cell colors and statuses - the canvas just draws it."""
+    board_canvas: BoardCanvas
+
+    solver_thread: threading.Thread | None = None
+    """The background thread running the solver, if solving"""
+    cancel_solving_event: threading.Event | None = None
+    solver_buttons: list[ttk.Button]
+    """The buttons that start the solver (Save too, as it counts the solutions). Disabled while solving"""
+    on_solver_done: Callable[[object], None] | None = None
+    """Called on the Tk thread with what the solve returned, once it has finished (not if it failed)"""
+    solver_updates: queue.Queue
+    """(board, kind, data) from the solver thread, for the Tk thread. kind is 'cells' (list of (x, y, status)), 'message', 'error' or 'done'.
+    Only the Tk thread touches the widgets, so the solver thread sends everything through here.
+    """
+
+    solution_cache: SolutionCache | None = None
+    """Open while 'Use solution cache' is ticked. Only Auto Solve and Load Grid use it"""
+
+    SOLVER_POLL_MS = 50
+    """How often the Tk thread looks for updates from the solver thread"""
 
     def __init__(self, root: tk.Tk):
 
@@ -34,6 +56,8 @@ class GUI:
         # 4th section holds a print terminal
         
         root.title("LinkedIn Queens Solver")
+        self.root = root
+        self.solver_updates = queue.Queue()
 
         # so if the window is resized by the user, somehow this makes everything stay in the middle. Still not familiar with how this works.
         root.rowconfigure(0, weight=1)
@@ -70,8 +94,9 @@ class GUI:
         self.color_picker_button.grid(row=2, column=1, sticky="w")
 
         ## (queens cell grid)
-        self.cell_grid = ttk.Frame(mainframe)
-        self.cell_grid.grid(row=1, padx=10, pady=10)
+        self.board_canvas = BoardCanvas(mainframe)
+        self.board_canvas.canvas.grid(row=1, padx=10, pady=10)
+        self.board_canvas.canvas.bind("<Button-3>", func=self.change_cell_color) # on right-click, change cell color
 
         ### second row of grid config frame (grid command buttons)
         create_grid_button = ttk.Button(grid_configs, command=self.create_new_grid, text="Create Grid / Reset")
@@ -90,10 +115,15 @@ class GUI:
         axiom1_button = ttk.Button(solving_controls, text="Axiom 1", command=self.axiom_1)
         axiom2_button = ttk.Button(solving_controls, text="Axiom 2", command=self.axiom_2)
         auto_solve_button = ttk.Button(solving_controls, text="Auto Solve", command=self.auto_solve)
+        exact_solve_button = ttk.Button(solving_controls, text="Exact Solve", command=self.exact_solve)
+        self.cancel_button = ttk.Button(solving_controls, text="Cancel", command=self.cancel_solving, state="disabled")
         mark_queens_button.grid(row=0, column=0)
         axiom1_button.grid(row=0,column=1)
         axiom2_button.grid(row=0,column=2)
         auto_solve_button.grid(row=0,column=3) 
+        exact_solve_button.grid(row=0,column=4)
+        self.cancel_button.grid(row=0,column=5)
+        self.solver_buttons = [save_grid_button, mark_queens_button, axiom1_button, axiom2_button, auto_solve_button, exact_solve_button]
 
         ### solving controls frame 2nd row
         times_to_think_ahead_label = tk.Label(solving_controls, text="Axiom 1 - no. of moves to think ahead")
@@ -101,13 +131,17 @@ class GUI:
         self.think_ahead = ttk.Entry(solving_controls)
         self.think_ahead.grid(row=1, column=2)
         self.think_ahead.insert(tk.END, '1') # default value
+        self.use_solution_cache = tk.BooleanVar(value=False) # off by default, so nothing is written to the home directory unless asked
+        use_solution_cache_button = ttk.Checkbutton(solving_controls, text="Use solution cache", variable=self.use_solution_cache, command=self.toggle_solution_cache)
+        use_solution_cache_button.grid(row=1, column=3, columnspan=2)
 
         ## terminal
         terminal = tk.Text(mainframe, wrap="word", bg="black", fg="white", insertbackground="white", height=12)
         terminal.grid(row=3, padx=10, pady=10)
         # text.pack(expand=True, fill="both")
-        sys.stdout = STDOutHandler(terminal) # tell sys.stdout that our STDOutHandler object is the new stdout
-        sys.stderr = STDErrHandler(terminal) # tell sys.stderr that our STDErrHandler object is the new stderr
+        terminal_buffer = TextWidgetBuffer(terminal) # shared, so stdout and stderr stay in order
+        sys.stdout = STDOutHandler(terminal, terminal_buffer) # tell sys.stdout that our STDOutHandler object is the new stdout
+        sys.stderr = STDErrHandler(terminal, terminal_buffer) # tell sys.stderr that our STDErrHandler object is the new stderr
 
         # padding
         for child in grid_configs.winfo_children():
@@ -116,6 +150,16 @@ class GUI:
             child.grid_configure(padx=5, pady=2)
 
 
+    def toggle_solution_cache(self):
+        """For the checkbutton command. Opens the solution cache (so Auto Solve answers the puzzles solved before straight away), or closes it.
+        """
+        if self.use_solution_cache.get():
+            try: self.solution_cache = SolutionCache()
+            except sqlite3.Error as e:
+                print(f"Solution cache not available: {e}", file=sys.stderr)
+                self.use_solution_cache.set(False)
+        else: self.solution_cache = None # not closed here - an Auto Solve running in the background may still be using it
+
     def pick_color(self):
         """This will change the self.__chosen_color variable and update the color picker button.
         """
@@ -130,10 +174,22 @@ class GUI:
         """Change a cell color to the current self.chosen_color
 
         Args:
-            event (tk.Event): This tk.Event should correspond to a gui cell.
+            event (tk.Event): A click on the board canvas.
         """
-        cell: tk.Label = event.widget
-        cell.config(bg=self.chosen_color)
+        if self.board is None or self.solver_thread is not None: return
+        clicked_cell = self.board_canvas.cell_at(event.x, event.y)
+        if clicked_cell is None: return
+        x, y = clicked_cell
+
+        # the color sets change, so make the board afresh
+        cells: list[Cell] = []
+        for row in self.board.cell_grid:
+            for cell in row:
+                color = cell.color
+                if cell.x == x and cell.y == y: color = self.chosen_color
+                cells.append(Cell(cell.x, cell.y, color, cell.status))
+        self.board = Board(self.grid_size, self.grid_size, cells)
+        self.board_canvas.draw_cell_color(x, y, self.chosen_color)
 
     def create_new_grid(self):
         """Function to create a cell grid (the queens board) in the GUI with whatever grid size the user has entered
@@ -156,28 +212,17 @@ class GUI:
             colors (list[list[str]], optional): Colors of the cells. List of list - book reading order - i.e. left to right, top to bottom. 
                 Defaults to None. If none, all cells will be initialized with white. Colors are tkinter compatible string values: e.g.: "blue", "#FF0000", etc.
         """
-        # reset cells
-        for cell in self.gui_cells: cell.destroy()
-        self.gui_cells = []
+        # the solver would be working on the old grid
+        self.cancel_solving()
 
+        cells: list[Cell] = []
         for row_number in range(0, grid_size):
             for col_number in range(0, grid_size):
                 color = "white"
                 if colors: color = colors[row_number][col_number]
-                cell = tk.Label(
-                    self.cell_grid, 
-                    fg="black", bg=color, # i guess fg affects the border color
-                    # text="t", 
-                    borderwidth=2, relief="solid", # solid border
-                    # padx=2, pady=2, # this refers to the interior padding
-                    height=2, width=4 # it seems to make a square, height should be half the width
-                )
-                cell.grid(
-                    row=row_number, column=col_number, 
-                    padx=2, pady=2 # this refers to the external padding. i.e. the spacing between individual cells
-                )
-                cell.bind("<Button-3>", func=self.change_cell_color) # on right-click, change cell color
-                self.gui_cells.append(cell)
+                cells.append(Cell(x=col_number, y=row_number, color=color))
+        self.board = Board(grid_size, grid_size, cells)
+        self.board_canvas.draw_board(self.board)
 
     def load_new_grid(self):
         """Load a grid from a json file.
@@ -213,6 +258,10 @@ class GUI:
         self.grid_size = grid_size
         self.__create_new_grid(grid_size, colors)
 
+        cache = self.solution_cache
+        if cache is not None and cache.get(self.board) is not None:
+            print("This puzzle has been solved before - Auto Solve will answer from the solution cache.")
+
 
     def grid_colors_2_json_dict(self) -> dict:
         """Saves the information about the grid to a dictionary. Considers only the blank board - i.e. crosses and queens locations are not saved.
@@ -220,13 +269,9 @@ class GUI:
         grid_size = self.grid_size
         
         colors: list[list[str]] = []
-        for y in range(0, grid_size):
-            colors_in_this_row: list[str] = []
-            for x in range(0, grid_size):
-                gui_cell = self.gui_cells[x + self.grid_size * y]
-                color_str = gui_cell.cget("bg")
-                colors_in_this_row.append(color_str)
-            colors.append(colors_in_this_row)
+        if self.board is not None:
+            for row in self.board.cell_grid:
+                colors.append([cell.color for cell in row])
 
         output = {
             "rows": grid_size,
@@ -260,7 +305,34 @@ class GUI:
         """
         # get the dict representation that can be saved to a json
         dict_repr = self.grid_colors_2_json_dict()
+        if self.solver_thread is not None: return
+        if self.board is None:
+            self.__write_grid(dict_repr)
+            return
 
+        # a puzzle should have exactly one solution. Counting them can take a while, so it runs in the background (and can be cancelled).
+        # It's done on a blank copy of the board, made from our own cells so the colors are exactly the ones shown
+        blank_board = Board(self.board.length, self.board.height, [Cell(cell.x, cell.y, cell.color) for row in self.board.cell_grid for cell in row])
+        def count_solutions(_: Board, cancel_event: threading.Event) -> SolutionCount | None:
+            try: return SolvingLogic.count_solutions(blank_board, cancel=cancel_event)
+            except SolveCancelled: return None
+        print("Checking that the puzzle has exactly one solution... (Cancel to skip)")
+        board = self.board
+        self.__start_solving(count_solutions, lambda solution_count: self.__save_grid(board, dict_repr, solution_count))
+
+    def __save_grid(self, board: Board, dict_repr: dict, solution_count: SolutionCount | None):
+        """Save the grid once its solutions are counted (solution_count is None if that was cancelled)"""
+        if board is not self.board: return # the grid was replaced in the meantime
+        if solution_count is None:
+            if not messagebox.askyesno("Not verified", "Could not verify that this puzzle has exactly one solution. Save anyway?"): return
+        elif solution_count.count == 0:
+            if not messagebox.askyesno("No solution", "This puzzle has no solution. Save anyway?"): return
+        elif not solution_count.is_unique():
+            message = f"This puzzle has more than one solution. The first 2 solutions found differ at cells (x, y): {solution_count.differing_cells}. Save anyway?"
+            if not messagebox.askyesno("Ambiguous puzzle", message): return
+        self.__write_grid(dict_repr)
+
+    def __write_grid(self, dict_repr: dict):
         # ask the user for the filepath
         file_path = filedialog.asksaveasfilename(defaultextension=".json",
                                              filetypes=[("JSON files", "*.json")])
@@ -272,41 +344,73 @@ class GUI:
         messagebox.showinfo("Saved", f"Grid saved to {file_path}")
 
     
-    def __update_gui_to_board(self):
-        # first create Cells
-        cells: list[Cell] = []
-        for gui_cell in self.gui_cells:
-            grid_information = gui_cell.grid_info()
-            column_index = grid_information['column']
-            row_index = grid_information['row']
-            color_str = gui_cell.cget("bg")
-            text = gui_cell.cget("text")
-            if text == None: text = ""
-            cell_status = CellStatus.get_status_for(text)
-            cell = Cell(x=column_index, y=row_index, color=color_str, status=cell_status)
-            cells.append(cell)
-
-        # then create Board
-        self.board = Board(self.grid_size, self.grid_size, cells)
-        
+    def __start_solving(self, solve: Callable[[Board, threading.Event], object], on_done: Callable[[object], None] | None = None):
+        """Run solve(board, cancel_event) on a background thread, so the window stays responsive. The board is repainted as the solver goes.
+        Then on_done(what solve returned) is called on the Tk thread - unless solve raised (e.g. was cancelled). Does nothing if already solving.
+        """
+        if self.solver_thread is not None or self.board is None: return
+        self.on_solver_done = on_done
+        self.cancel_solving_event = threading.Event()
+        self.solver_thread = threading.Thread(target=self.__solve_in_background, args=(solve, self.board, self.cancel_solving_event), daemon=True)
+        self.cancel_button.config(state="normal")
+        for button in self.solver_buttons: button.config(state="disabled")
+        self.solver_thread.start()
+        self.root.after(self.SOLVER_POLL_MS, self.__poll_solver_updates)
+
+    def __solve_in_background(self, solve: Callable[[Board, threading.Event], object], board: Board, cancel_event: threading.Event):
+        """Runs on the solver thread."""
+        def send_changed_cells():
+            changed_cells = board.take_dirty_cells()
+            if changed_cells: self.solver_updates.put((board, 'cells', [(cell.x, cell.y, cell.status) for cell in changed_cells]))
+
+        def on_solver_event(event: SolverEvent):
+            send_changed_cells() # the changes the event is about
+            if event.message is not None: self.solver_updates.put((board, 'message', event.message))
+
+        finished, result = False, None
+        try:
+            with SolvingLogic.events.listening_only(on_solver_event): result = solve(board, cancel_event)
+            finished = True
+        except SolveCancelled: self.solver_updates.put((board, 'message', "Cancelled."))
+        except Exception: self.solver_updates.put((board, 'error', traceback.format_exc()))
+        finally:
+            send_changed_cells()
+            self.solver_updates.put((board, 'done', (finished, result)))
+
+    def __poll_solver_updates(self):
+        """Runs on the Tk thread, every SOLVER_POLL_MS while solving."""
+        while True:
+            try: board, kind, data = self.solver_updates.get_nowait()
+            except queue.Empty: break
+
+            if kind == 'done':
+                self.solver_thread = None
+                self.cancel_button.config(state="disabled")
+                for button in self.solver_buttons: button.config(state="normal")
+                finished, result = data
+                on_done, self.on_solver_done = self.on_solver_done, None
+                if finished and on_done is not None: on_done(result)
+                return
+            if kind == 'message': print(data)
+            elif kind == 'error': print(data, file=sys.stderr)
+            elif kind == 'cells' and board is self.board: # not for an old grid
+                # only the cells the solver has changed need redrawing
+                for x, y, status in data: self.board_canvas.draw_cell_status(x, y, status)
+
+        self.root.after(self.SOLVER_POLL_MS, self.__poll_solver_updates)
 
-    def __update_board_to_gui(self):
-        for y, row in enumerate(self.board.cell_grid):
-            for x, cell in enumerate(row):
-                gui_cell = self.gui_cells[x + self.grid_size * y]
-                gui_cell.config(text=cell.status.value, bg=cell.color)
+    def cancel_solving(self):
+        """For the button command. Stops the solver at its next step."""
+        if self.cancel_solving_event is not None: self.cancel_solving_event.set()
 
     def mark_queens(self):
         """For the button command.
         """
-        self.__update_gui_to_board()
-        SolvingLogic.mark_queens_where_certain(self.board)
-        self.__update_board_to_gui()
+        self.__start_solving(lambda board, cancel_event: SolvingLogic.mark_queens_where_certain(board))
 
     def axiom_1(self):
         """For the button command.
         """
-        self.__update_gui_to_board()
         try: 
             times_to_think_ahead = int(self.think_ahead.get())
             if times_to_think_ahead < 1 or times_to_think_ahead > 20: 
@@ -315,19 +419,20 @@ class GUI:
         except ValueError: 
             times_to_think_ahead = 1
             self.think_ahead.insert(tk.END, '1') # default value
-        SolvingLogic.axiom_1_should_not_block_color_sets(self.board, times_to_think_ahead)
-        self.__update_board_to_gui()
+        self.__start_solving(lambda board, cancel_event: SolvingLogic.axiom_1_should_not_block_color_sets(board, times_to_think_ahead, cancel=cancel_event))
 
     def axiom_2(self):
         """For the button command.
         """
-        self.__update_gui_to_board()
-        SolvingLogic.axiom_2_color_common_holdings(self.board)
-        self.__update_board_to_gui()
+        self.__start_solving(lambda board, cancel_event: SolvingLogic.axiom_2_color_common_holdings(board))
 
     def auto_solve(self):
         """For the button command.
         """
-        self.__update_gui_to_board()
-        SolvingLogic.auto_solve(self.board)
-        self.__update_board_to_gui()
\ No newline at end of file
+        cache = self.solution_cache
+        self.__start_solving(lambda board, cancel_event: SolvingLogic.auto_solve(board, cancel=cancel_event, solution_cache=cache))
+
+    def exact_solve(self):
+        """For the button command.
+        """
+        self.__start_solving(lambda board, cancel_event: SolvingLogic.exact_solve(board, cancel_event))
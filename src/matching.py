@@ -0,0 +1,72 @@
+from src.queens_board import bit_indices
+
+
+def prune_holdings(holdings: list[int]) -> list[int] | None:
+    """Every colorset without a queen needs a row (or column) of its own to put its queen on.
+    So the colorsets and the rows/columns they hold must have a perfect matching (a row/column for each colorset, no two sharing).
+    A colorset can't have its queen on a row/column that is not part of any perfect matching either - this removes those from its holdings.
+
+    This is every deduction axiom 2 can make (and more), in one go. e.g. if 2 colorsets only hold rows 3 and 4, they get matched to rows 3 and 4
+    in every perfect matching, so rows 3 and 4 are removed from every other colorset's holdings.
+
+    Finds a matching with Kuhn's augmenting paths. Then a colorset-row pair outside the matching is only part of some perfect matching
+    if it lies on an alternating cycle, i.e. if the colorset currently matched to that row can find its way back to the first colorset.
+    (Hopcroft-Karp would find the matching in fewer steps, but with a few dozen colorsets held as bitmasks this is faster in Python.)
+
+    Args:
+        holdings (list[int]): Per colorset without a queen, bitmask of the rows/columns held by its blank cells (bit i = row/column i).
+
+    Returns:
+        list[int] | None: The holdings without the rows/columns that can't be used, same order. None if there is no perfect matching
+        (i.e. the board can't be solved from here).
+    """
+    matched_to: dict[int, int] = {} # row/column -> colorset (index into holdings)
+    visited = 0
+    def augment(colorset: int) -> bool:
+        nonlocal visited
+        for i in bit_indices(holdings[colorset] & ~visited):
+            visited |= 1 << i
+            if i not in matched_to or augment(matched_to[i]):
+                matched_to[i] = colorset
+                return True
+        return False
+
+    for colorset in range(0, len(holdings)):
+        visited = 0
+        if not augment(colorset): return None
+    matched_line = {colorset: i for i, colorset in matched_to.items()}
+    matched_lines = 0
+    for i in matched_to: matched_lines |= 1 << i
+
+    # colorset a -> colorset b, if a holds the row/column b is matched to
+    successors: list[int] = []
+    for colorset, held in enumerate(holdings):
+        successor_mask = 0
+        for i in bit_indices(held & matched_lines & ~(1 << matched_line[colorset])):
+            successor_mask |= 1 << matched_to[i]
+        successors.append(successor_mask)
+    reachable: list[int] = []
+    for colorset in range(0, len(holdings)):
+        reached = successors[colorset]; frontier = reached
+        while frontier:
+            new = 0
+            for other in bit_indices(frontier): new |= successors[other]
+            frontier = new & ~reached
+            reached |= new
+        reachable.append(reached)
+
+    # normally every row/column held is matched. If not (e.g. a queen's row wasn't crossed off), a colorset that can get to one of those can swap too
+    can_swap = 0
+    for colorset, held in enumerate(holdings):
+        if held & ~matched_lines: can_swap |= 1 << colorset
+    if can_swap:
+        for colorset in range(0, len(holdings)):
+            if reachable[colorset] & can_swap: can_swap |= 1 << colorset
+
+    pruned = list(holdings)
+    for colorset, held in enumerate(holdings):
+        for i in bit_indices(held & matched_lines & ~(1 << matched_line[colorset])):
+            # swapping colorset onto row/column i only works if the colorset i is matched to can find its way back around the cycle
+            if not (reachable[matched_to[i]] >> colorset & 1 or can_swap >> matched_to[i] & 1):
+                pruned[colorset] &= ~(1 << i)
+    return pruned
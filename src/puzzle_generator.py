@@ -0,0 +1,189 @@
+import colorsys
+import random
+
+from src.bitboard import BitBoard
+from src.queens_board import Board
+from src.solving_logic import SolvingLogic
+
+
+class PuzzleGenerator:
+    """Generates LinkedIn-style Queens puzzles: a size x size board with size connected colorsets and exactly one solution.
+
+    How it works:
+    1. Place the queens of the solution at random (one per row and column, none adjacent). Each queen starts its own colorset.
+    2. Grow the colorsets one cell at a time. Cells not in a colorset yet are crossed out, so the partial board has only our solution to begin with.
+       Giving a cell to a colorset can only add solutions (ones with a queen on that cell), so we check with the bitboard search
+       if there is a solution with a queen there, and only keep the move if there isn't. Otherwise the cell is left for another colorset.
+    3. Once every cell is in a colorset, the puzzle has exactly one solution. If some cells could not be given to any colorset,
+       take the cells around them out of their colorsets and grow again (a few times, then start over).
+
+    Puzzles are dictionaries in the same json shape Board.from_json reads (and the GUI saves).
+    """
+
+    rng: random.Random
+
+    GROWTH_SKEW = 3
+    """Growth rate of a colorset is random() ** GROWTH_SKEW. Higher - more uneven colorset sizes."""
+
+    MAX_REPAIRS = 10
+    """If some cells can't be given to any colorset, clear the area around them and grow again - at most this many times, then start over"""
+
+    REPAIR_RADIUS = 3
+    """Cells this close to a stuck cell are cleared"""
+
+    def __init__(self, seed: int | str | None = None):
+        """
+        Args:
+            seed (int | str | None, optional): Same seed, same puzzles. Defaults to None (random).
+        """
+        self.rng = random.Random(seed)
+
+    def generate(self, size: int) -> dict:
+        """Generate a puzzle with exactly one solution.
+
+        Every cell given to a colorset is checked with the bitboard search, so the time grows quickly with the size:
+        roughly 0.1-0.5 s per puzzle up to 20x20, a few seconds at 25x25 and 10-15 s at 30x30.
+
+        Returns:
+            dict: e.g. {"rows": 2, "cols": 2, "colors": [["#ff0000", "#00ff00"], ...]}
+        """
+        if size < 1: raise ValueError(f"The size must be at least 1, not {size}")
+        if size in [2, 3]: raise ValueError(f"There is no valid queens placement for a {size}x{size} board")
+
+        colors = PuzzleGenerator.palette(size)
+        while True:
+            queen_cols = self.__place_queens(size)
+            color_ids = self.__grow_colorsets(size, queen_cols)
+            if color_ids is None: continue
+            puzzle = {
+                "rows": size,
+                "cols": size,
+                "colors": [[colors[color_id] for color_id in row] for row in color_ids]
+            }
+            # double check with the Board model, the way the puzzle will be loaded
+            if SolvingLogic.count_solutions(Board.from_dict(puzzle)).is_unique(): return puzzle
+
+    def generate_board(self, size: int) -> Board:
+        """Same as generate, but as a Board."""
+        return Board.from_dict(self.generate(size))
+
+    @staticmethod
+    def palette(size: int) -> list[str]:
+        """size distinct colors, e.g. '#ff8040', spread around the color wheel"""
+        colors: list[str] = []
+        for i in range(0, size):
+            saturation = [0.45, 0.7, 0.3][i % 3]
+            value = [1.0, 0.85][i % 2]
+            while True:
+                r, g, b = colorsys.hsv_to_rgb(i / size, saturation, value)
+                color = f"#{round(r * 255):02x}{round(g * 255):02x}{round(b * 255):02x}"
+                if color not in colors: break
+                value -= 0.01 # only happens for very big boards
+            colors.append(color)
+        return colors
+
+    def __place_queens(self, size: int) -> list[int]:
+        """Random solution. Returns the column of the queen of each row."""
+        queen_cols: list[int] = []
+        used_cols: set[int] = set()
+
+        def place(row_y: int) -> bool:
+            if row_y == size: return True
+            cols = list(range(0, size))
+            self.rng.shuffle(cols)
+            for col_x in cols:
+                if col_x in used_cols: continue
+                if queen_cols and abs(queen_cols[-1] - col_x) <= 1: continue # adjacent (diagonal) to the queen of the row above
+                queen_cols.append(col_x); used_cols.add(col_x)
+                if place(row_y + 1): return True
+                queen_cols.pop(); used_cols.remove(col_x)
+            return False
+
+        place(0)
+        return queen_cols
+
+    def __grow_colorsets(self, size: int, queen_cols: list[int]) -> list[list[int]] | None:
+        """Grow a colorset out of each queen's cell, keeping our solution the only one.
+
+        Returns:
+            list[list[int]] | None: the color id of each cell - list of rows. None if we got stuck.
+        """
+        color_ids = [[-1] * size for _ in range(0, size)]
+        for row_y, col_x in enumerate(queen_cols): color_ids[row_y][col_x] = row_y
+        # colorsets grow at different rates, so there are some small ones (like in the real puzzles) - these pin down the solution quicker
+        growth_rates = [self.rng.random() ** PuzzleGenerator.GROWTH_SKEW for _ in range(0, size)]
+
+        for _ in range(0, PuzzleGenerator.MAX_REPAIRS):
+            self.__grow(size, color_ids, growth_rates)
+            stuck_cells = [(x, y) for y in range(0, size) for x in range(0, size) if color_ids[y][x] == -1]
+            if not stuck_cells: return color_ids
+            PuzzleGenerator.__clear_around(size, queen_cols, color_ids, stuck_cells)
+        return None
+
+    def __grow(self, size: int, color_ids: list[list[int]], growth_rates: list[float]):
+        """Give the cells not in a colorset (-1) to neighbouring colorsets, one random cell at a time, as long as our solution stays the only one."""
+        color_masks = [0] * size
+        candidates: list[dict[tuple[int, int], None]] = [{} for _ in range(0, size)] # per colorset: cells it could grow into next (dict as an ordered set)
+        for y in range(0, size):
+            for x in range(0, size):
+                color_id = color_ids[y][x]
+                if color_id == -1: continue
+                color_masks[color_id] |= 1 << (x + size * y)
+                for x_, y_ in PuzzleGenerator.__neighbours(size, x, y):
+                    if color_ids[y_][x_] == -1: candidates[color_id][(x_, y_)] = None
+
+        growing = [color_id for color_id in range(0, size) if candidates[color_id]]
+        while growing:
+            color_id = self.rng.choices(growing, [growth_rates[color_id] for color_id in growing])[0]
+            x, y = self.rng.choice(list(candidates[color_id]))
+
+            color_masks[color_id] |= 1 << (x + size * y)
+            # the new solutions this could make all have a queen on the cell
+            if not PuzzleGenerator.__has_solution_with_queen_at(size, color_masks, x + size * y):
+                color_ids[y][x] = color_id
+                for other_candidates in candidates: other_candidates.pop((x, y), None)
+                for x_, y_ in PuzzleGenerator.__neighbours(size, x, y):
+                    if color_ids[y_][x_] == -1: candidates[color_id][(x_, y_)] = None
+            else:
+                color_masks[color_id] &= ~(1 << (x + size * y))
+                del candidates[color_id][(x, y)]
+            growing = [color_id for color_id in range(0, size) if candidates[color_id]]
+
+    @staticmethod
+    def __clear_around(size: int, queen_cols: list[int], color_ids: list[list[int]], stuck_cells: list[tuple[int, int]]):
+        """Take the cells near the stuck cells out of their colorsets (except our queens), so they can grow in differently.
+        Taking cells out can't add solutions. Parts of colorsets cut off from their queen are taken out too.
+        """
+        radius = PuzzleGenerator.REPAIR_RADIUS
+        for x, y in stuck_cells:
+            for y_ in range(max(0, y - radius), min(size, y + radius + 1)):
+                for x_ in range(max(0, x - radius), min(size, x + radius + 1)):
+                    if queen_cols[y_] != x_: color_ids[y_][x_] = -1
+
+        connected = set()
+        for row_y, col_x in enumerate(queen_cols): # colorset i was grown from the queen of row i
+            to_visit = [(col_x, row_y)]
+            connected.add((col_x, row_y))
+            while to_visit:
+                x, y = to_visit.pop()
+                for x_, y_ in PuzzleGenerator.__neighbours(size, x, y):
+                    if (x_, y_) not in connected and color_ids[y_][x_] == row_y:
+                        connected.add((x_, y_))
+                        to_visit.append((x_, y_))
+        for y in range(0, size):
+            for x in range(0, size):
+                if (x, y) not in connected: color_ids[y][x] = -1
+
+    @staticmethod
+    def __has_solution_with_queen_at(size: int, color_masks: list[int], index: int) -> bool:
+        """Is there a solution with a queen on the cell (bit index)? Cells not in a colorset yet are crossed out."""
+        placed = 0
+        for color_mask in color_masks: placed |= color_mask
+        # thousands of these per puzzle, so straight to the bitboard search instead of through a Board
+        return len(BitBoard.from_color_masks(size, size, color_masks, placed, 1 << index).find_solutions(1)) > 0
+
+
+    @staticmethod
+    def __neighbours(size: int, x: int, y: int) -> list[tuple[int, int]]:
+        """Cells sharing an edge with the cell"""
+        return [(x_, y_) for x_, y_ in [(x-1, y), (x+1, y), (x, y-1), (x, y+1)] if 0 <= x_ < size and 0 <= y_ < size]
@@ -1,11 +1,33 @@
 from enum import Enum
+import functools
 import json
+import random
+import threading
 from copy import deepcopy
 
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill
 
+from src.transposition_table import TranspositionTable
+
+
+def bit_indices(mask: int):
+    """Yields the indices of the set bits of mask, lowest first."""
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class SolveCancelled(Exception):
+    """Raised by the solver when its cancel event is set - see SolvingLogic (cancel). The board is left in a consistent state (as of the last finished step)."""
+
+
+def check_cancelled(cancel: threading.Event | None):
+    """Raise SolveCancelled if the cancel event is set. Called at every step of the long running searches (thinking ahead, the exact search)."""
+    if cancel is not None and cancel.is_set(): raise SolveCancelled()
+
 
 class CellStatus(Enum):
     """BLANK, CROSS or QUEEN. Value is a string representing a suitable character.
@@ -27,12 +49,59 @@ class CellStatus(Enum):
             raise Exception("Unidentified character")
 
 
+_ZOBRIST_RANDOM = random.Random(0) # seeded, so that hashes are the same from run to run
+_ZOBRIST_KEYS: list[dict['CellStatus', int]] = []
+"""Random 64-bit key for every (cell index, status). Grown as bigger boards come along."""
+_ZOBRIST_LOCK = threading.Lock()
+"""Held while growing _ZOBRIST_KEYS, so that two threads growing it at once can't give an index two different keys"""
+
+def _zobrist_key(index: int, status: 'CellStatus') -> int:
+    if len(_ZOBRIST_KEYS) <= index:
+        with _ZOBRIST_LOCK:
+            # check again - another thread may have grown it while we waited
+            while len(_ZOBRIST_KEYS) <= index:
+                _ZOBRIST_KEYS.append({status_: _ZOBRIST_RANDOM.getrandbits(64) for status_ in CellStatus})
+    return _ZOBRIST_KEYS[index][status] # keys are only ever added, so reading needs no lock
+
+@functools.lru_cache(maxsize = 16)
+def _blank_zobrist_hash(cell_count: int) -> int:
+    """Zobrist hash of a board of cell_count cells that are all blank. Cached, so that making a new board of a size seen before doesn't hash every cell."""
+    zobrist_hash = 0
+    for index in range(0, cell_count): zobrist_hash ^= _zobrist_key(index, CellStatus.BLANK)
+    return zobrist_hash
+
+
+@functools.lru_cache(maxsize = 16)
+def _layout_masks(length: int, height: int) -> tuple[list[int], list[int], list[int]]:
+    """Row masks, column masks and - per cell - the row, column and adjacent cells, for a board size.
+    Cached, so boards of a size seen before (e.g. one puzzle after another in a long running process) don't build them again.
+    """
+    row_masks = [((1 << length) - 1) << (length * y) for y in range(0, height)]
+    first_col_mask = 0
+    for y in range(0, height): first_col_mask |= 1 << (length * y)
+    col_masks = [first_col_mask << x for x in range(0, length)]
+
+    block_masks = []
+    for y in range(0, height):
+        for x in range(0, length):
+            mask = row_masks[y] | col_masks[x]
+            for col_x in [x-1, x+1]:
+                for row_y in [y-1, y+1]:
+                    if 0 <= col_x < length and 0 <= row_y < height: mask |= 1 << (col_x + length * row_y)
+            block_masks.append(mask)
+    return row_masks, col_masks, block_masks
+
+
 class Cell:
     """A single cell of the Queens board
     """
 
+    __slots__ = ('color', 'color_id', 'x', 'y', 'status') # no per-cell __dict__, so cells are smaller and quicker to copy
+
     color: str
     """expected to be a 6-digit color value hex: e.g. 'FF0010'"""
+    color_id: int
+    """Index of the color in the palette of the cell's board (Board.colors), set by the board. Cheaper to compare than the color itself."""
     x: int
     """x-coordinate (0-indexing) \n\n x-coord is from left to right. y-coord is from top to bottom. Origin is at the top-left of the board."""
     y: int
@@ -45,40 +114,59 @@ class Cell:
         Args:
             color (str): 6-digit hex code. e.g. 'FF0010'
         """
-        self.color = color; 
+        self.color = color
+        self.color_id = -1 # until it's on a board
         self.x = x; self.y = y
         self.status = status
 
+    def __deepcopy__(self, memo: dict) -> 'Cell':
+        copy_cell = self.__class__.__new__(self.__class__)
+        copy_cell.color = self.color; copy_cell.color_id = self.color_id; copy_cell.x = self.x; copy_cell.y = self.y; copy_cell.status = self.status
+        return copy_cell
+
 
 class ColorSet:
     """A group of cells on the Queens board with the same color
     """
 
+    __slots__ = ('color', 'color_id', '_held_rows', '_held_cols', 'cells')
+
     color: str
     """expected to be a 6-digit color value hex: e.g. 'FF0010'"""
+    color_id: int
+    """Index of the color in the board's palette (Board.colors)"""
     _held_rows: set[int]
     """The row numbers held by the ColorSet's blank cells. 0-indexed. e.g. if the color set's blank cells spans the first 3 rows, this set would have 0,1,2"""
     _held_cols: set[int]
     """The column numbers held by the ColorSet's blank cells. 0-indexed. e.g. if the color set's blank cells spans the first 3 columns, this set would have 0,1,2"""
     cells: list[Cell]
 
-    def __init__(self, cells: list[Cell], color: str):
+    def __init__(self, cells: list[Cell], color: str, color_id: int):
         """_summary_
 
         Args:
             color (str): expected to be a 6-digit color value hex: e.g. 'FF0010'
+            color_id (int): its index in the board's palette. Only the cells with this color id are taken.
         """
 
         self.color = color
+        self.color_id = color_id
         self._held_cols = set(); self._held_rows = set()
 
         self.cells = []
         for cell in cells:
-            if cell.color == self.color: 
+            if cell.color_id == self.color_id: 
                 self.cells.append(cell)
                 self._held_cols.add(cell.x)
                 self._held_rows.add(cell.y)
 
+    def __deepcopy__(self, memo: dict) -> 'ColorSet':
+        copy_color_set = self.__class__.__new__(self.__class__)
+        copy_color_set.color = self.color; copy_color_set.color_id = self.color_id
+        copy_color_set._held_rows = set(self._held_rows); copy_color_set._held_cols = set(self._held_cols)
+        copy_color_set.cells = deepcopy(self.cells, memo)
+        return copy_color_set
+
     def refresh_holdings(self):
         """Refresh the held_rows and cols of the object."""
         self._held_cols = set(); self._held_rows = set()
@@ -108,16 +196,51 @@ class Board:
     """
     color_sets: dict[str, ColorSet]
     """Maps 6-digit color hexcode to ColorSets"""
+    colors: list[str]
+    """The palette - the color of every color id on this board, in order of first appearance. Each board has its own, so a long running
+    process (e.g. solve_server.py) doesn't keep every color it was ever sent.
+    """
 
     cell_grid: list[list[Cell]]
     """Convention such that we can access a cell via y,x.  i.e. self.cell_grid[y][x].\n 
     So the self.cell_grid would be a list of rows.
     """
 
+    _block_masks: list[int] | None
+    """For every cell (by index = x + length * y), a bitmask of the cells it would block if it were a queen. Bit i is the cell with index i.\n
+    This only depends on the layout of the board, so it is built once on first use (see get_block_masks) and shared by copies of the board.
+    """
+
+    _trail: list[tuple[Cell, CellStatus, bool, int]]
+    """Undo log. Every status change made through set_cell_status (so also by marking queens and crossing cells) is pushed here as
+    (cell, old status, whether the cell was already dirty, dirty generation).\n
+    See checkpoint() and undo_to().
+    """
+
+    zobrist_hash: int
+    """Hash of the cell statuses of the board (XOR of a random key per cell index and status). Kept up to date on every status change, so it is cheap to get."""
+    transposition_table: TranspositionTable
+    """Memo for would_cell_block_color_set_n. Keyed on the zobrist hash, so it stays valid as the board changes. Shared by copies of the board."""
+
+    modification_count: int
+    """Goes up by one with every cell status change (undos included) and never goes down. So if it hasn't moved, nothing has happened to the board."""
+    _dirty_cells: dict[Cell, None]
+    """Cells whose status has changed since the last take_dirty_cells() call, in the order they first changed. Used as an ordered set.\n
+    Changes that are undone again don't count.
+    """
+    _dirty_generation: int
+    """Goes up by one every time the dirty cells are taken"""
+
     def __init__(self, length: int, height: int, cells: list[Cell]):
         self.length = length
         self.height = height
         self.color_sets = {}
+        self._block_masks = None
+        self._trail = []
+        self.transposition_table = TranspositionTable()
+        self.modification_count = 0
+        self._dirty_cells = {}
+        self._dirty_generation = 0
 
         # initialize cell grid, so we can add the cells to it later in any order
         self.cell_grid = []
@@ -129,20 +252,33 @@ class Board:
         for cell in cells:
             self.cell_grid[cell.y][cell.x] = cell
 
-        # create the color sets
-        same_colored_cells: dict[str, list[Cell]] = {}
+        # give the colors their ids, and the cells of a color the same string
+        palette: dict[str, int] = {}
+        self.colors = []
         for cell in cells:
-            if cell.color not in same_colored_cells.keys():
-                same_colored_cells[cell.color] = [cell]
-            else:
-                same_colored_cells[cell.color].append(cell)
+            color_id = palette.get(cell.color)
+            if color_id is None:
+                color_id = palette[cell.color] = len(self.colors)
+                self.colors.append(cell.color)
+            cell.color = self.colors[color_id]; cell.color_id = color_id
 
-        for color in same_colored_cells.keys():
+        # create the color sets
+        same_colored_cells: list[list[Cell]] = [[] for _ in self.colors] # by color id
+        for cell in cells: same_colored_cells[cell.color_id].append(cell)
+
+        for color_id, color in enumerate(self.colors):
             color_set = ColorSet(
-                cells=same_colored_cells[color],
-                color=color
+                cells=same_colored_cells[color_id],
+                color=color,
+                color_id=color_id
             )
-            self.color_sets[color] = color_set
+            self.color_sets[color_set.color] = color_set
+
+        self.zobrist_hash = _blank_zobrist_hash(length * height)
+        for cell in cells:
+            if cell.status != CellStatus.BLANK:
+                index = self.get_index_of(cell)
+                self.zobrist_hash ^= _zobrist_key(index, CellStatus.BLANK) ^ _zobrist_key(index, cell.status)
     
     @classmethod
     def from_json(cls, filepath: str):
@@ -150,7 +286,12 @@ class Board:
         """
         with open(filepath, "rt") as f:
             data = json.load(f)
+        return cls.from_dict(data)
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Initialize the board from the dictionary representing the board (i.e. the loaded json - see from_json).
+        """
         # the json has the cell color values as a list of rows.
         # Each row displays the values from left to right
         # The rows are listed in the order top to bottom.
@@ -169,6 +310,19 @@ class Board:
             cells = cells
         )
 
+    def __deepcopy__(self, memo: dict) -> 'Board':
+        # the block masks never change for a layout, so let the copy share them instead of copying them
+        if self._block_masks is not None: memo[id(self._block_masks)] = self._block_masks
+        # same for the transposition table - its keys include the whole board state - and the palette
+        memo[id(self.transposition_table)] = self.transposition_table
+        memo[id(self.colors)] = self.colors
+
+        copy_board = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copy_board
+        for name, value in self.__dict__.items():
+            setattr(copy_board, name, deepcopy(value, memo))
+        return copy_board
+
 
 
     def to_excel(self, filepath: str, offset: int = 0):
@@ -228,56 +382,101 @@ class Board:
         return grid
 
 
-    def __would_block_cells(self, cell: Cell) -> set[Cell]:
-        """If the input cell is made queen, get the set of cells that it would block.
-        """
-        x = cell.x; y = cell.y
+    def get_block_masks(self) -> list[int]:
+        """For every cell (by index = x + length * y), get a bitmask of the cells it would block if it were a queen. Bit i is the cell with index i.
 
-        blocked_cells: set[Cell] = set()
+        i.e. the cells on the same row and column, the adjacent cells (diagonal) and the cells of the same color - except itself ofcourse.
+        Built on the first call and reused from then on (also by copies of the board). Only the colors are added per board,
+        the rest is the same for every board of the size (see _layout_masks).
+        """
+        if self._block_masks is None:
+            color_masks: dict[int, int] = {} # by color id
+            for color_set in self.color_sets.values():
+                mask = 0
+                for cell in color_set.cells: mask |= 1 << self.get_index_of(cell)
+                color_masks[color_set.color_id] = mask
+
+            layout_block_masks = _layout_masks(self.length, self.height)[2]
+            block_masks = []
+            for index, cell in enumerate(cell for row in self.cell_grid for cell in row):
+                block_masks.append((layout_block_masks[index] | color_masks[cell.color_id]) & ~(1 << index))
+            self._block_masks = block_masks
+        return self._block_masks
+
+    def get_index_of(self, cell: Cell) -> int:
+        """Index of the cell in book reading order - i.e. x + length * y"""
+        return cell.x + self.length * cell.y
 
-        # cells on the same row and column
-        for col_x in range(0, self.length):
-            cell_ = self.cell_grid[y][col_x]
-            blocked_cells.add(cell_)
-        for row_y in range(0, self.height):
-            cell_ = self.cell_grid[row_y][x]
-            blocked_cells.add(cell_)
-
-        # adjacent cells (diagonal)
-        for col_x in [x-1, x+1]:
-            for row_y in [y-1, y+1]:
-                if col_x < 0 or row_y < 0: continue # normally this would trigger an IndexError and safely skip but this is Python and it uses negative indexing so...
-                try: 
-                    cell_ = self.cell_grid[row_y][col_x]
-                    blocked_cells.add(cell_)
-                except IndexError: continue
-
-        # cells of the same color
-        same_color_set = self.color_sets[cell.color]
-        for cell_ in same_color_set.cells:
-            blocked_cells.add(cell_)
-
-        # except itself ofcourse
-        blocked_cells.remove(cell)
-
-        return blocked_cells
-    
     def get_cell_at(self, x: int, y: int) -> Cell:
         return self.cell_grid[y][x]
 
+    def set_cell_status(self, cell: Cell, status: CellStatus):
+        """Change the status of a cell, recording the change in the trail so that it can be undone."""
+        if cell.status == status: return
+        self._trail.append((cell, cell.status, cell in self._dirty_cells, self._dirty_generation))
+        index = self.get_index_of(cell)
+        self.zobrist_hash ^= _zobrist_key(index, cell.status) ^ _zobrist_key(index, status)
+        cell.status = status
+        self._dirty_cells[cell] = None
+        self.modification_count += 1
+
+    def cross_cell(self, cell: Cell):
+        """Mark a cell as unable to be a queen."""
+        self.set_cell_status(cell, CellStatus.CROSS)
+
+    def checkpoint(self) -> int:
+        """Get a checkpoint of the current board state, to be used with undo_to() or has_changed_since()."""
+        return len(self._trail)
+
+    def undo_to(self, checkpoint: int):
+        """Roll back all the status changes made since the checkpoint."""
+        while len(self._trail) > checkpoint:
+            cell, status, was_dirty, dirty_generation = self._trail.pop()
+            index = self.get_index_of(cell)
+            self.zobrist_hash ^= _zobrist_key(index, cell.status) ^ _zobrist_key(index, status)
+            cell.status = status
+            self.modification_count += 1
+            # if the dirty cells were taken since the change, the cell has changed (back) since then, so it stays dirty
+            if not was_dirty and dirty_generation == self._dirty_generation: self._dirty_cells.pop(cell, None)
+            else: self._dirty_cells[cell] = None
+
+    def has_dirty_cells(self) -> bool:
+        """If any cell status has changed since the last take_dirty_cells() call. O(1)"""
+        return len(self._dirty_cells) > 0
+
+    def take_dirty_cells(self) -> list[Cell]:
+        """Get the cells whose status has changed since the last call, and start tracking afresh.
+        """
+        dirty_cells = list(self._dirty_cells)
+        self._dirty_cells = {}
+        self._dirty_generation += 1
+        return dirty_cells
+
+    def has_changed_since(self, checkpoint: int) -> bool:
+        """If any cell status has changed since the checkpoint. O(1), unlike has_board_changed.
+
+        Only valid if nothing was undone to before the checkpoint in the meantime.
+        """
+        return len(self._trail) != checkpoint
+
+    def changed_cells_since(self, checkpoint: int) -> list[Cell]:
+        """The cells whose status has changed since the checkpoint, each once, in the order they first changed.
+
+        Only valid if nothing was undone to before the checkpoint in the meantime.
+        """
+        return list(dict.fromkeys(entry[0] for entry in self._trail[checkpoint:]))
 
     def __mark_queen(self, cell: Cell):
         """Mark a cell as a queen. Cross out all the blank cells it would block
         """
-        x = cell.x; y = cell.y
-
         # mark cell as queen
-        self.cell_grid[y][x].status = CellStatus.QUEEN
+        self.set_cell_status(cell, CellStatus.QUEEN)
 
         # cross out all the blank cells it would block
-        would_block_cells = self.__would_block_cells(cell)
-        for cell in would_block_cells:
-            if cell.status == CellStatus.BLANK: cell.status = CellStatus.CROSS
+        block_mask = self.get_block_masks()[self.get_index_of(cell)]
+        for i in bit_indices(block_mask):
+            cell_ = self.cell_grid[i // self.length][i % self.length]
+            if cell_.status == CellStatus.BLANK: self.set_cell_status(cell_, CellStatus.CROSS)
 
 
     def mark_queens_where_certain(self) -> bool:
@@ -357,19 +556,19 @@ class Board:
     def would_cell_block_color_set(self, cell: Cell) -> bool:
         """Assuming a cell is a Queen, would it block any other color set completely?
         """
-        would_block_cells = self.__would_block_cells(cell)
+        block_mask = self.get_block_masks()[self.get_index_of(cell)]
 
-        # for each color set, get a list of blank cells. If all blank cells are included in would_block_cells, that color set would be blocked.
+        # for each color set, get a list of blank cells. If all blank cells are included in the block mask, that color set would be blocked.
         for color_set in self.color_sets.values():
-            if color_set.color == cell.color: continue
+            if color_set.color_id == cell.color_id: continue
 
             blank_cells = color_set.get_blank_cells()
             if len(blank_cells) == 0: continue
-            if blank_cells.issubset(would_block_cells): return True
+            if all(block_mask >> self.get_index_of(cell_) & 1 for cell_ in blank_cells): return True
 
         return False
     
-    def would_cell_block_color_set_n(self, cell: Cell, n: int) -> bool:
+    def would_cell_block_color_set_n(self, cell: Cell, n: int, cancel: threading.Event | None = None) -> bool:
         """Assuming a cell is a Queen, would it block any other color set completely?
 
         Uses recursion to check n number of moves ahead.
@@ -377,37 +576,49 @@ class Board:
         There can be a cell that would not block any other colorset completely by itself, however marking any of the remaining cells that would be left after it
         is marked queen would result in a colorset getting blocked.
 
+        Results are memoized in the transposition table (n == 1 too, as checking every color set is the expensive part).
+
         Args:
             cell (Cell): _description_
             n (int): How many moves to check ahead.
+            cancel (threading.Event | None, optional): Checked at every step of the recursion - raises SolveCancelled once it is set.
 
         Returns:
             bool: _description_
         """
         # if n == 0: return False
-        if n == 1: return self.would_cell_block_color_set(cell) # optimization, avoids unnecessary deepcopy below. It also makes the above line obsolete.
-
-        # copy the board
-        copy_board = deepcopy(self)
-        the_cell = copy_board.get_cell_at(cell.x, cell.y)
-
-        if copy_board.would_cell_block_color_set(the_cell): return True
-        
-        copy_board.__mark_queen(the_cell)
-
-        blank_cells = copy_board.get_blank_cells()
-        results: list[tuple[Cell, bool]] = []
-        for _cell in blank_cells:
-            result = copy_board.would_cell_block_color_set_n(_cell, n-1) # recursion
-            results.append((_cell, result))
+        check_cancelled(cancel)
+        key = (self.zobrist_hash, self.get_index_of(cell), n)
+        result = self.transposition_table.get(key)
+        if result is None:
+            if n == 1: result = self.would_cell_block_color_set(cell)
+            else: result = self.__would_cell_block_color_set_n(cell, n, cancel)
+            self.transposition_table.put(key, result)
+        return result
+
+    def __would_cell_block_color_set_n(self, cell: Cell, n: int, cancel: threading.Event | None = None) -> bool:
+        """would_cell_block_color_set_n without the transposition table"""
+        if self.would_cell_block_color_set(cell): return True
+
+        # mark the cell as queen on this board, and undo it when done - no board copies needed
+        checkpoint = self.checkpoint()
+        self.__mark_queen(cell)
+        try:
+            blank_cells = self.get_blank_cells()
+            results: list[tuple[Cell, bool]] = []
+            for _cell in blank_cells:
+                result = self.would_cell_block_color_set_n(_cell, n-1, cancel) # recursion
+                results.append((_cell, result))
+        finally:
+            self.undo_to(checkpoint)
 
         # if in at least one color set, all the cells have returned True, return True
-        colors_results: dict[str, list[bool]] = {}
+        colors_results: dict[int, list[bool]] = {} # by color id
         for cell, result in results:
-            if cell.color not in colors_results.keys():
-                colors_results[cell.color] = [result]
+            if cell.color_id not in colors_results.keys():
+                colors_results[cell.color_id] = [result]
             else:
-                colors_results[cell.color].append(result)
+                colors_results[cell.color_id].append(result)
         # print(colors_results)
         for values in colors_results.values():
             atleast_one_false = False
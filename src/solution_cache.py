@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.queens_board import Board, CellStatus
+
+
+class SolutionCache:
+    """Remembers the solutions of puzzles on disk (an SQLite file), so a puzzle that was solved before is answered straight away.
+
+    Keyed on the color layout of the board only, made canonical over the 8 rotations/reflections of the board and over relabeling the colors
+    (see canonical_layout). So the same daily puzzle is found again however it was saved - rotated, mirrored or in other colors.
+    Only complete solutions are stored (the queens). Keeps at most max_entries puzzles, dropping the least recently used ones.
+
+    Safe to use from several threads, and from several processes (SQLite locks the file).
+    """
+
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".linkedin_queens_solver", "solutions.sqlite3")
+    MAX_ENTRIES = 10000
+
+    path: str
+    max_entries: int
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+        # write-ahead log without syncing every commit - a cache can afford to lose its last few entries on a power cut
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS solutions (layout TEXT PRIMARY KEY, queens TEXT NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def canonical_layout(board: Board) -> tuple[str, list[int]]:
+        """The key of the board's color layout, and how its cells map onto the canonical layout.
+
+        Each of the 8 rotations/reflections of the board (4 for a non-square board) is written out in reading order with the colors
+        numbered by first appearance. The smallest of those is the canonical layout.
+
+        Returns:
+            tuple[str, list[int]]: The key (a hash of the canonical layout), and for every cell of the canonical layout (by index),
+            the index (x + length * y) of the board cell it came from.
+        """
+        indices = [[x + board.length * y for x in range(0, board.length)] for y in range(0, board.height)]
+        orientations = []
+        grid = indices
+        for _ in range(0, 4):
+            orientations.append(grid)
+            orientations.append([row[::-1] for row in grid])
+            grid = [list(row) for row in zip(*grid[::-1])] # rotate by 90 degrees
+        if board.length != board.height:
+            orientations = [grid for grid in orientations if len(grid) == board.height]
+
+        cells = [cell for row in board.cell_grid for cell in row]
+        best_layout = None; best_mapping = None; best_size = None
+        for grid in orientations:
+            mapping = [index for row in grid for index in row]
+            labels: dict[int, int] = {}
+            layout = [labels.setdefault(cells[index].color_id, len(labels)) for index in mapping]
+            if best_layout is None or layout < best_layout:
+                best_layout = layout; best_mapping = mapping; best_size = (len(grid), len(grid[0]))
+
+        key = hashlib.sha256(json.dumps([best_size, best_layout]).encode()).hexdigest()
+        return key, best_mapping
+
+    def get(self, board: Board) -> list[int] | None:
+        """The queens (as cell indices, x + length * y) of the board's solution, if it is in the cache. Ignores the board's cell statuses."""
+        key, mapping = SolutionCache.canonical_layout(board)
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT queens FROM solutions WHERE layout = ?", (key,)).fetchone()
+            if row is None: return None
+            self._connection.execute("UPDATE solutions SET last_used = ? WHERE layout = ?", (time.time(), key))
+        return sorted(mapping[index] for index in json.loads(row[0]))
+
+    def put(self, board: Board):
+        """Remember the board's solution. The board must be solved (see Board.is_game_over)."""
+        key, mapping = SolutionCache.canonical_layout(board)
+        cells = [cell for row in board.cell_grid for cell in row]
+        queens = [canonical_index for canonical_index, index in enumerate(mapping) if cells[index].status == CellStatus.QUEEN]
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO solutions (layout, queens, last_used) VALUES (?, ?, ?)", (key, json.dumps(queens), time.time()))
+            # evict the least recently used puzzles over the limit
+            self._connection.execute(
+                "DELETE FROM solutions WHERE layout IN (SELECT layout FROM solutions ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+            )
+
+    def apply(self, board: Board) -> bool:
+        """If the board's solution is in the cache, and the board's queens and crosses so far agree with it, mark it on the board
+        (the queens, everything else crossed).
+
+        Returns:
+            bool: If the board was solved from the cache.
+        """
+        queens = self.get(board)
+        if queens is None: return False
+        cells = [cell for row in board.cell_grid for cell in row]
+        queens = set(queens)
+        for index, cell in enumerate(cells):
+            if (cell.status == CellStatus.QUEEN and index not in queens) or (cell.status == CellStatus.CROSS and index in queens): return False
+
+        for index, cell in enumerate(cells):
+            board.set_cell_status(cell, CellStatus.QUEEN if index in queens else CellStatus.CROSS)
+        return True
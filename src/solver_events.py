@@ -0,0 +1,169 @@
+import contextlib
+import json
+import sys
+import threading
+from typing import Callable, TextIO
+
+
+class SolverEvent:
+    """Something the solver did. See SolverEvents.
+
+    kind is one of:
+    - 'rule': a rule was run (even if it changed nothing). Has rule, seconds, cells_crossed, queens_placed (and depth when thinking ahead).
+    - 'turn': a rule changed the board and counts as a turn. Has rule, turn and message.
+    - 'solved', 'stuck' or 'no_solution': the solver finished. Has message.
+    """
+
+    kind: str
+    rule: str | None
+    """'mark_queens', 'axiom_1', 'axiom_2_rows', 'axiom_2_cols', 'think_ahead', 'exact_search' or 'solution_cache'"""
+    turn: int | None
+    message: str | None
+    """Human readable progress line (what auto_solve used to print)"""
+    seconds: float | None
+    cells_crossed: int | None
+    queens_placed: int | None
+    depth: int | None
+    """How many moves ahead the rule looked (thinking ahead only)"""
+
+    def __init__(self, kind: str, rule: str | None = None, turn: int | None = None, message: str | None = None, seconds: float | None = None,
+                 cells_crossed: int | None = None, queens_placed: int | None = None, depth: int | None = None):
+        self.kind = kind
+        self.rule = rule
+        self.turn = turn
+        self.message = message
+        self.seconds = seconds
+        self.cells_crossed = cells_crossed
+        self.queens_placed = queens_placed
+        self.depth = depth
+
+    def to_dict(self) -> dict:
+        """The fields that are set"""
+        return {name: value for name, value in vars(self).items() if value is not None}
+
+
+class SolverEvents:
+    """Where the solver reports what it does. Each listener is called with every SolverEvent, in order.
+
+    When there are no listeners, the solver skips the timing and counting altogether, so this costs next to nothing.
+    SolvingLogic.events starts out with a TextSink, which prints the progress like before.
+    """
+
+    _listeners: list[Callable[[SolverEvent], None]]
+    """The listeners of every thread that isn't in listening_only"""
+    _local: threading.local
+    """listeners: the listeners of this thread, while in listening_only"""
+
+    def __init__(self, listeners: list[Callable[[SolverEvent], None]] | None = None):
+        self._listeners = list(listeners) if listeners else []
+        self._local = threading.local()
+
+    @property
+    def listeners(self) -> list[Callable[[SolverEvent], None]]:
+        """The listeners that get the events of a solve on this thread"""
+        return getattr(self._local, 'listeners', self._listeners)
+
+    def add_listener(self, listener: Callable[[SolverEvent], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[SolverEvent], None]):
+        self._listeners.remove(listener)
+
+    @contextlib.contextmanager
+    def listening_only(self, *listeners: Callable[[SolverEvent], None]):
+        """Temporarily replace the listeners, e.g. `with SolvingLogic.events.listening_only(counter_sink): ...`. No listeners mutes the solver.
+
+        Only for this thread - a solve running on another thread at the same time (e.g. the GUI's solver thread) keeps its own listeners.
+        """
+        old_listeners = getattr(self._local, 'listeners', None)
+        self._local.listeners = list(listeners)
+        try: yield self
+        finally:
+            if old_listeners is None: del self._local.listeners
+            else: self._local.listeners = old_listeners
+
+    def emit(self, event: SolverEvent):
+        for listener in self.listeners: listener(event)
+
+    def message(self, kind: str, message: str, rule: str | None = None, turn: int | None = None):
+        """Emit a 'turn' (or end of solve) event with a progress message."""
+        if not self.listeners: return
+        self.emit(SolverEvent(kind, rule=rule, turn=turn, message=message))
+
+
+class TextSink:
+    """Prints the progress messages. stream defaults to whatever sys.stdout is at the time (so the GUI's STDOutHandler gets them)."""
+
+    stream: TextIO | None
+
+    def __init__(self, stream: TextIO | None = None):
+        self.stream = stream
+
+    def __call__(self, event: SolverEvent):
+        if event.message is not None: print(event.message, file=self.stream or sys.stdout)
+
+
+class JsonTraceSink:
+    """Writes every event as a json line, e.g. to a file for later analysis."""
+
+    stream: TextIO
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def __call__(self, event: SolverEvent):
+        self.stream.write(json.dumps(event.to_dict()) + "\n")
+
+
+class RuleStats:
+    """Totals for one rule, see CounterSink"""
+
+    invocations: int
+    turns: int
+    """Invocations that changed the board enough to count as a turn"""
+    cells_crossed: int
+    queens_placed: int
+    seconds: float
+    max_depth: int
+    """Deepest thinking ahead (0 if the rule doesn't think ahead)"""
+
+    def __init__(self):
+        self.invocations = 0
+        self.turns = 0
+        self.cells_crossed = 0
+        self.queens_placed = 0
+        self.seconds = 0.0
+        self.max_depth = 0
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class CounterSink:
+    """Adds up the 'rule' and 'turn' events per rule, in memory. e.g. for benchmarks."""
+
+    rules: dict[str, RuleStats]
+    """rule name -> totals"""
+
+    def __init__(self):
+        self.rules = {}
+
+    def __call__(self, event: SolverEvent):
+        if event.rule is None: return
+        stats = self.rules.get(event.rule)
+        if stats is None: stats = self.rules[event.rule] = RuleStats()
+        if event.kind == 'turn':
+            stats.turns += 1
+            return
+        if event.kind != 'rule': return
+        stats.invocations += 1
+        stats.cells_crossed += event.cells_crossed or 0
+        stats.queens_placed += event.queens_placed or 0
+        stats.seconds += event.seconds or 0.0
+        stats.max_depth = max(stats.max_depth, event.depth or 0)
+
+    def reset(self):
+        self.rules = {}
+
+    def to_dict(self) -> dict[str, dict]:
+        return {rule: stats.to_dict() for rule, stats in self.rules.items()}
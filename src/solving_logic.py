@@ -1,137 +1,620 @@
-from copy import deepcopy
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, TimeoutError
+from typing import Callable, TypeVar
 
-from src.queens_board import Board, CellStatus
+from src.queens_board import Board, Cell, CellStatus, SolveCancelled, bit_indices, check_cancelled
+from src.bitboard import BitBoard
+from src.matching import prune_holdings
+from src.solution_cache import SolutionCache
+from src.solver_events import SolverEvent, SolverEvents, TextSink
+
+
+T = TypeVar('T')
+
+
+class SolutionCount:
+    """Result of SolvingLogic.count_solutions
+    """
+
+    count: int
+    """Number of solutions found. The search stops at the limit, so if count == limit there may be more."""
+    limit: int
+    differing_cells: list[tuple[int, int]]
+    """(x, y) of the cells that are a queen in one of the first 2 solutions found but not in the other. Empty if less than 2 solutions were found."""
+
+    def __init__(self, count: int, limit: int, differing_cells: list[tuple[int, int]]):
+        self.count = count
+        self.limit = limit
+        self.differing_cells = differing_cells
+
+    def is_unique(self) -> bool:
+        return self.count == 1
+
+
+class RuleCost:
+    """Running averages of what a rule costs and what it yields, to rank the rules by - see PropagationEngine and CostAwareStrategy."""
+
+    name: str
+    runs: int
+    average_seconds: float
+    average_yield: float
+    """Cell status changes per run"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.runs = 0
+        self.average_seconds = 0.0
+        self.average_yield = 0.0
+
+    def record(self, seconds: float, cells_changed: int, smoothing: float):
+        """Update the running averages (exponential moving averages - recent runs count the most)."""
+        if self.runs == 0:
+            self.average_seconds = seconds; self.average_yield = cells_changed
+        else:
+            self.average_seconds += smoothing * (seconds - self.average_seconds)
+            self.average_yield += smoothing * (cells_changed - self.average_yield)
+        self.runs += 1
+
+    def value(self) -> float:
+        """Cells changed per second, recently. Rules that haven't run yet come first."""
+        if self.runs == 0: return float('inf')
+        return self.average_yield / max(self.average_seconds, 1e-9)
+
+
+class PropagationEngine:
+    """Runs the cheap rules - queen marking, axiom 1 (without thinking ahead) and axiom 2 - until none of them can change the board any more.
+
+    Work queue based (like AC-3): a rule is only queued again when a cell it depends on changes, instead of every rule being re-run over the whole board.
+    - Queen marking for a row/column/colorset depends on the cells of that row/column/colorset.
+    - Axiom 1 for a colorset (crossing the cells that would block all of it) depends on the cells of that colorset.
+    - Axiom 2 for the rows or columns depends on the holdings of every colorset, so any change queues it.
+      As it looks at the whole board, it is only run once the other rules have nothing left to do.
+
+    There is a queue per rule. Next, the queue of the rule with the best value (see RuleCost) is worked off - value being the cells the rule
+    recently changed per second, measured per queue worked off. It is picked among queen marking and axiom 1 first, then among the axiom 2
+    rules, ties going to the rules in the order above. Picking per queue rather than per row, column or colorset keeps the bookkeeping cheap.
+
+    The changed cells are found through the board's dirty cells, so changes made by anything else (e.g. thinking ahead with self.bitboard)
+    are picked up on the next run(). Keep using the same engine between runs to benefit from that - CostAwareStrategy does.
+    """
+
+    RULES = ('mark_queens', 'axiom_1', 'axiom_2_rows', 'axiom_2_cols')
+    LOCAL_RULES = ('mark_queens', 'axiom_1')
+    """The rules that look at one row, column or colorset - run before the others"""
+
+    board: Board
+    bitboard: BitBoard
+    """Make any other changes to the board through this, so they stay in sync with the engine"""
+    costs: dict[str, RuleCost]
+    """By rule name. Kept from one run() to the next"""
+    smoothing: float
+    """Weight of the latest run in the running averages of the rules' cost and yield"""
+    _queues: dict[str, deque[int]]
+    """Ids to run each rule on, by rule name. 'mark_queens' takes unit ids, 'axiom_1' color ids and the axiom 2 rules just 0."""
+    _queued: set[tuple[str, int]]
+
+    def __init__(self, board: Board, bitboard: BitBoard | None = None, smoothing: float = 0.5):
+        """
+        Args:
+            bitboard (BitBoard | None, optional): A BitBoard of the board to work through, e.g. the one used for thinking ahead. Defaults to a new one.
+        """
+        self.board = board
+        self.bitboard = bitboard if bitboard is not None else BitBoard(board)
+        self.costs = {name: RuleCost(name) for name in self.RULES}
+        self.smoothing = smoothing
+        _ = board.take_dirty_cells() # everything is queued to begin with anyway
+
+        self._queues = {name: deque() for name in self.RULES}; self._queued = set()
+        for unit_id in range(0, self.bitboard.get_unit_count()): self.__queue('mark_queens', unit_id)
+        for color_id in range(0, self.bitboard.get_color_count()): self.__queue('axiom_1', color_id)
+        self.__queue('axiom_2_rows', 0); self.__queue('axiom_2_cols', 0)
+
+    def __queue(self, name: str, id: int):
+        if (name, id) in self._queued: return
+        self._queued.add((name, id))
+        self._queues[name].append(id)
+
+    def __queue_dependents(self):
+        """Queue the rules that depend on the cells that have changed."""
+        dirty_cells = self.board.take_dirty_cells()
+        for cell in dirty_cells:
+            for unit_id in self.bitboard.get_unit_ids_of(cell): self.__queue('mark_queens', unit_id)
+            self.__queue('axiom_1', self.bitboard.get_color_id_of(cell))
+        if dirty_cells:
+            self.__queue('axiom_2_rows', 0); self.__queue('axiom_2_cols', 0)
+
+    def run(self, cancel: threading.Event | None = None, report: Callable[[str, str], None] | None = None) -> bool:
+        """Run the rules until the queue is empty.
+
+        Args:
+            cancel (threading.Event | None, optional): Checked before every rule, see SolvingLogic (cancel).
+            report (Callable[[str, str], None] | None, optional): Called with the rule name and what it did (for the 'Turn ...' message)
+                every time a rule changes the board.
+
+        Returns:
+            bool: If the board was changed.
+        """
+        modification_count = self.board.modification_count
+        self.__queue_dependents()
+
+        while True:
+            queued = [name for name in self.LOCAL_RULES if self._queues[name]]
+            if not queued: queued = [name for name in self.RULES if self._queues[name]]
+            if not queued: break
+            name = max(queued, key=lambda name: self.costs[name].value()) # max keeps the first of equals, so ties go in RULES order
+            queue = self._queues[name]
+
+            checkpoint = self.board.checkpoint()
+            start = time.perf_counter()
+            while queue: # the ids this rule queues for itself on the way included
+                SolvingLogic._check_cancelled(cancel)
+                id = queue.popleft()
+                self._queued.remove((name, id))
+                if name == 'mark_queens':
+                    did = SolvingLogic._run_rule(self.board, name, lambda: self.bitboard.mark_queen_if_single_blank(id)) and "Queens Marked"
+                elif name == 'axiom_1':
+                    did = SolvingLogic._run_rule(self.board, name, lambda: self.bitboard.cross_cells_blocking_colorset(id)) and "Crossed off cells that would block color sets"
+                else:
+                    axis, string = ('row', 'rows') if name == 'axiom_2_rows' else ('col', 'columns')
+                    changes_made_on = SolvingLogic._run_rule(self.board, name, lambda: SolvingLogic._axiom_2_on_axis(self.bitboard, axis))
+                    did = changes_made_on and f"Axis color common used on {string} {changes_made_on}"
+                if did and report is not None: report(name, did)
+                self.__queue_dependents()
+            self.costs[name].record(time.perf_counter() - start, self.board.checkpoint() - checkpoint, self.smoothing)
+
+        return self.board.modification_count != modification_count
+
+
+def _would_indices_block_color_set_n(lookahead_state: tuple, indices: list[int], n: int) -> list[bool]:
+    """would_cell_block_color_set_n for a chunk of cells (by bit index). Runs in the worker processes - see SolvingLogic._first_cell_blocking_color_set_n
+    """
+    bitboard = BitBoard.from_lookahead_state(lookahead_state)
+    return [bitboard.would_index_block_color_set_n(index, n) for index in indices]
 
 
 class SolvingLogic:
+    """The solving rules. Every method takes a Board and solves it in place.
+
+    use_bitboard: if True (the default), the work is done by a BitBoard engine made from the board, which writes its changes through to the board's cells.
+    If False, the Board's own (slower) methods are used. Both give the same results.
+
+    workers: if more than 1, thinking ahead (axiom 1 with 2 or more moves) is spread across a pool of that many processes. Gives the same results as 1.
+    (On Windows, scripts using this need the usual `if __name__ == "__main__":` guard.)
+
+    Progress (the 'Turn ...' lines) and per rule metrics are reported through SolvingLogic.events - see src/solver_events.py.
+
+    cancel: a threading.Event. Once it is set (e.g. from the GUI thread), the solver stops and raises SolveCancelled - at the next rule, or within
+    the thinking ahead recursion and the exact search, which check it at every step.
+    """
+
+    events: SolverEvents = SolverEvents([TextSink()])
+    """Listeners get every SolverEvent. Starts with a TextSink, which prints the progress."""
+
+    solution_cache: SolutionCache | None = None
+    """If set, auto_solve answers the puzzles solved before from it, and adds the ones it solves. Off by default.
+    Set for the whole process (solve_batch.py --cache does), so to use a cache for some solves only, pass it to auto_solve instead."""
+
+    _CHUNKS_PER_WORKER = 4
+    """The blank cells are split into this many chunks per worker, so that the workers finish at about the same time"""
+
+    _CANCEL_POLL_SECONDS = 0.1
+    """How often to check the cancel event while waiting for the workers"""
+
+    @staticmethod
+    def _run_rule(board: Board, rule: str, run: Callable[[], T], depth: int | None = None) -> T:
+        """Run a rule and emit a 'rule' event with how long it took and what it changed. Just runs it if nothing is listening."""
+        events = SolvingLogic.events
+        if not events.listeners: return run()
+
+        start = time.perf_counter()
+        checkpoint = board.checkpoint()
+        result = run()
+        seconds = time.perf_counter() - start
+        cells_crossed = 0; queens_placed = 0
+        for cell in board.changed_cells_since(checkpoint):
+            if cell.status == CellStatus.CROSS: cells_crossed += 1
+            elif cell.status == CellStatus.QUEEN: queens_placed += 1
+        events.emit(SolverEvent('rule', rule=rule, seconds=seconds, cells_crossed=cells_crossed, queens_placed=queens_placed, depth=depth))
+        return result
+
+    @staticmethod
+    def _check_cancelled(cancel: threading.Event | None):
+        check_cancelled(cancel)
+
+    @staticmethod
+    def _engine(board: Board, use_bitboard: bool) -> Board | BitBoard:
+        if use_bitboard: return BitBoard(board)
+        return board
+
+    @staticmethod
+    def mark_queens_where_certain(board: Board, use_bitboard: bool = True):
+        engine = SolvingLogic._engine(board, use_bitboard)
+        _ = SolvingLogic._run_rule(board, 'mark_queens', engine.mark_queens_where_certain)
 
     @staticmethod
-    def mark_queens_where_certain(board: Board):
-        _ = board.mark_queens_where_certain()
+    def _process_pool(workers: int) -> ProcessPoolExecutor | None:
+        if workers > 1: return ProcessPoolExecutor(max_workers=workers)
+        return None
 
     @staticmethod
-    def axiom_1_should_not_block_color_sets(board: Board, n = 1):
-        blank_cells = board.get_blank_cells()
-        for cell in blank_cells:
-            if board.would_cell_block_color_set_n(cell, n): 
-                cell.status = CellStatus.CROSS
-                if n > 1: break
+    def _first_cell_blocking_color_set_n(engine: Board | BitBoard, board: Board, n: int, executor: Executor | None = None, workers: int = 1,
+                                         cancel: threading.Event | None = None):
+        """Get the first blank cell (in book reading order) that would_cell_block_color_set_n. None if there is none.
+
+        If an executor is given, the cells are checked in chunks on it, in parallel. The chunks are still looked at in order, so the result is the same.
+        """
+        blank_cells = engine.get_blank_cells()
+        if executor is None:
+            for cell in blank_cells:
+                SolvingLogic._check_cancelled(cancel)
+                if engine.would_cell_block_color_set_n(cell, n, cancel): return cell
+            return None
+
+        lookahead_state = BitBoard(board).get_lookahead_state()
+        chunk_size = max(1, -(-len(blank_cells) // (workers * SolvingLogic._CHUNKS_PER_WORKER))) # ceiling division
+        chunks = [blank_cells[i:i + chunk_size] for i in range(0, len(blank_cells), chunk_size)]
+        futures = [
+            executor.submit(_would_indices_block_color_set_n, lookahead_state, [board.get_index_of(cell) for cell in chunk], n)
+            for chunk in chunks
+        ]
+        try:
+            for chunk, future in zip(chunks, futures):
+                while True:
+                    SolvingLogic._check_cancelled(cancel)
+                    try:
+                        results = future.result(timeout=SolvingLogic._CANCEL_POLL_SECONDS)
+                        break
+                    except TimeoutError: pass
+                for cell, result in zip(chunk, results):
+                    if result: return cell
+            return None
+        finally:
+            for future in futures: future.cancel() # the chunks after the one with the answer are not needed
 
     @staticmethod
-    def axiom_2_color_common_holdings(board: Board):
+    def axiom_1_should_not_block_color_sets(board: Board, n = 1, use_bitboard: bool = True, workers: int = 1, cancel: threading.Event | None = None):
+        engine = SolvingLogic._engine(board, use_bitboard)
+        if n > 1:
+            # only one cell is crossed when thinking ahead
+            executor = SolvingLogic._process_pool(workers)
+            try: _ = SolvingLogic._run_rule(board, 'think_ahead', lambda: SolvingLogic._think_ahead(engine, board, n, executor, workers, cancel), depth=n)
+            finally:
+                if executor is not None: executor.shutdown(cancel_futures=True)
+            return
+
+        def axiom_1():
+            blank_cells = engine.get_blank_cells()
+            for cell in blank_cells:
+                if engine.would_cell_block_color_set_n(cell, n): engine.cross_cell(cell)
+        SolvingLogic._run_rule(board, 'axiom_1', axiom_1)
+
+    @staticmethod
+    def _think_ahead(engine: Board | BitBoard, board: Board, n: int, executor: Executor | None, workers: int, cancel: threading.Event | None = None):
+        """Cross the first cell that would_cell_block_color_set_n (if any). Returns the cell, or None."""
+        cell = SolvingLogic._first_cell_blocking_color_set_n(engine, board, n, executor, workers, cancel)
+        if cell is not None: engine.cross_cell(cell)
+        return cell
+
+    @staticmethod
+    def axiom_2_color_common_holdings(board: Board, use_bitboard: bool = True):
+        engine = SolvingLogic._engine(board, use_bitboard)
         for axis in ['row', 'col']:
-            colorset_axis_holdings: dict[str, frozenset[int]] = board.colorset_axis_holdings(axis)
-            change_made = False
-            changes_made_on = set()
-
-            # for each color, see what other color sets have the same or a subset of holdings
-            for color, my_holdings  in colorset_axis_holdings.items():
-                for done_holding in changes_made_on:
-                    if my_holdings.issubset(done_holding): continue
-                common_colors = [color]
-                for other_color, others_holdings in colorset_axis_holdings.items():
-                    if other_color == color: continue
-                    if len(others_holdings) == 0: continue # important, otherwise it would be considered a subset
-                    if others_holdings.issubset(my_holdings): common_colors.append(other_color)
-                if len(common_colors) == len(my_holdings):
-                    # the narrowing-down-logic condition is met
-                    # we can now cross off all other colors within these n columns/rows
-                    for idx1 in my_holdings:
-                        for idx2 in range(0, board.height):
-                            if axis == 'col': cell = board.cell_grid[idx2][idx1]
-                            else: cell = board.cell_grid[idx1][idx2]
-                            if cell.color not in common_colors and cell.status == CellStatus.BLANK: 
-                                cell.status = CellStatus.CROSS
-                                change_made = True
-                                changes_made_on.add(frozenset(my_holdings))
+            _ = SolvingLogic._run_rule(board, f'axiom_2_{axis}s', lambda: SolvingLogic._axiom_2_on_axis(engine, axis))
+
+    @staticmethod
+    def _axiom_2_on_axis(engine: Board | BitBoard, axis: str) -> set[frozenset[int]]:
+        """Axiom 2 on either the rows or the columns.
+
+        Done with a matching of the colorsets to the rows/columns they hold (see prune_holdings), which finds every group of n colorsets
+        held within n rows/columns in one go - including the ones hidden behind other groups.
+
+        Returns:
+            set[frozenset[int]]: The sets of rows/columns the axiom crossed off cells in. Empty if no change was made.
+        """
+        colorset_axis_holdings: dict[str, frozenset[int]] = engine.colorset_axis_holdings(axis)
+        colors = [color for color, my_holdings in colorset_axis_holdings.items() if my_holdings] # colorsets with a queen hold nothing
+        holdings = []
+        for color in colors:
+            held = 0
+            for idx in colorset_axis_holdings[color]: held |= 1 << idx
+            holdings.append(held)
+
+        pruned = prune_holdings(holdings)
+        if pruned is None: return set() # can't be solved from here, leave that to the other rules
+
+        changes_made_on = set()
+        for color, held, kept in zip(colors, holdings, pruned):
+            for idx1 in bit_indices(held & ~kept):
+                # we can cross off this color within this column/row
+                for idx2 in range(0, engine.height):
+                    if axis == 'col': cell = engine.cell_grid[idx2][idx1]
+                    else: cell = engine.cell_grid[idx1][idx2]
+                    if cell.color == color and cell.status == CellStatus.BLANK: engine.cross_cell(cell)
+                changes_made_on.add(SolvingLogic.__holding_group(pruned, idx1))
+
+        return changes_made_on
+
+    @staticmethod
+    def __holding_group(holdings: list[int], idx: int) -> frozenset[int]:
+        """The rows/columns connected to row/column idx through the colorsets holding them - after prune_holdings,
+        as many colorsets as there are rows/columns in the group, holding nothing else. (For the 'Turn ...' message)
+        """
+        group = 1 << idx; grown = True
+        while grown:
+            grown = False
+            for held in holdings:
+                if held & group and held & ~group:
+                    group |= held; grown = True
+        return frozenset(bit_indices(group))
+
+    @staticmethod
+    def propagate(board: Board):
+        """Run queen marking, axiom 1 (without thinking ahead) and axiom 2 until they can't change the board any more. See PropagationEngine
+        """
+        _ = PropagationEngine(board).run()
+
+    @staticmethod
+    def auto_solve(board: Board, use_bitboard: bool = True, workers: int = 1, cancel: threading.Event | None = None,
+                   strategy: 'AutoSolveStrategy | None' = None, solution_cache: SolutionCache | None = None) -> int:
+        """Apply the queen marking rules and the axioms until the board is solved or we are stuck.
+
+        strategy decides which rule to run when. Defaults to a new CostAwareStrategy. ClassicStrategy is the original loop.
+
+        If solution_cache (or else SolvingLogic.solution_cache) is set, a puzzle solved before is answered from it (in 0 turns).
+
+        Returns:
+            int: The number of turns taken.
+        """
+        cache = solution_cache if solution_cache is not None else SolvingLogic.solution_cache
+        if cache is not None and SolvingLogic._run_rule(board, 'solution_cache', lambda: cache.apply(board)):
+            SolvingLogic.events.message('solved', "All queens found! (from the solution cache)")
+            return 0
+
+        if strategy is None: strategy = CostAwareStrategy()
+        executor = SolvingLogic._process_pool(workers)
+        try:
+            engine = SolvingLogic._engine(board, use_bitboard)
+            def think_ahead(n: int):
+                return SolvingLogic._run_rule(board, 'think_ahead', lambda: SolvingLogic._think_ahead(engine, board, n, executor, workers, cancel), depth=n)
+            turns = strategy.solve(board, engine, think_ahead, cancel)
+        finally:
+            if executor is not None: executor.shutdown(cancel_futures=True)
+
+        if cache is not None and board.is_game_over(): cache.put(board)
+        return turns
+
+    @staticmethod
+    def exact_solve(board: Board, cancel: threading.Event | None = None) -> bool:
+        """Solve the board with a complete backtracking search (see BitBoard.solve) instead of the axioms.
+
+        Always finishes, and quickly even for 20x20 boards. Leaves the board in the same state auto_solve would for a solved board.
+        If cancel is set, raises SolveCancelled, leaving the board unchanged.
+
+        Returns:
+            bool: False if the board has no solution.
+        """
+        if SolvingLogic._run_rule(board, 'exact_search', lambda: BitBoard(board).solve(cancel)):
+            SolvingLogic.events.message('solved', "All queens found!")
+            return True
+        SolvingLogic.events.message('no_solution', "No solution exists for this board.")
+        return False
 
     @staticmethod
-    def auto_solve(board: Board):
+    def count_solutions(board: Board, limit: int = 2, cancel: threading.Event | None = None) -> SolutionCount:
+        """Count the solutions of the board (in its current state) with the backtracking search, stopping as soon as limit solutions are found.
+
+        The default limit of 2 is enough to tell if a puzzle has exactly one solution. The board is not changed.
+        """
+        solutions = BitBoard(board).find_solutions(limit, cancel)
+
+        differing_cells = []
+        if len(solutions) >= 2:
+            for i in bit_indices(solutions[0] ^ solutions[1]):
+                differing_cells.append((i % board.length, i // board.length))
+
+        return SolutionCount(len(solutions), limit, differing_cells)
+
+
+class AutoSolveStrategy:
+    """Decides which rule SolvingLogic.auto_solve runs when. Subclass and implement solve().
+    """
+
+    def solve(self, board: Board, engine: Board | BitBoard, think_ahead: Callable[[int], Cell | None], cancel: threading.Event | None) -> int:
+        """Solve the board (through the engine) until it is solved or we are stuck. Report turns through SolvingLogic.events.
+
+        Args:
+            think_ahead (Callable[[int], Cell | None]): think_ahead(n) crosses the first cell that would block a color set, thinking n moves ahead. Returns it, or None.
+            cancel (threading.Event | None): Check it with SolvingLogic._check_cancelled every now and then.
+
+        Returns:
+            int: The number of turns taken.
+        """
+        raise NotImplementedError()
+
+
+class ClassicStrategy(AutoSolveStrategy):
+    """The original auto_solve loop: queen marking, axiom 1 and axiom 2 every turn, and thinking ahead when a turn changes nothing."""
+
+    def solve(self, board: Board, engine: Board | BitBoard, think_ahead: Callable[[int], Cell | None], cancel: threading.Event | None) -> int:
         # Basically a copy of the old main.py
-        # TODO: Could refactor a bit using the other functions in this class
 
         TIMES_TO_THINK_AHEAD_MAX = 20
         TIMES_TO_THINK_AHEAD_MIN = 2
         times_to_think_ahead = TIMES_TO_THINK_AHEAD_MIN
         turn = 0
+        events = SolvingLogic.events
+
+        def axiom_1():
+            blank_cells = engine.get_blank_cells()
+            for cell in blank_cells:
+                if engine.would_cell_block_color_set(cell): engine.cross_cell(cell)
 
         while True:
-            old_board = deepcopy(board)
+            SolvingLogic._check_cancelled(cancel)
+            turn_start = board.checkpoint()
 
-            was_queens_marked = board.mark_queens_where_certain()
+            was_queens_marked = SolvingLogic._run_rule(board, 'mark_queens', engine.mark_queens_where_certain)
             if was_queens_marked:
-                print(f"Turn {turn}: Queens Marked")
+                events.message('turn', f"Turn {turn}: Queens Marked", 'mark_queens', turn)
                 turn += 1
 
-            if board.is_game_over():
-                print("All queens found!")
+            if engine.is_game_over():
+                events.message('solved', "All queens found!")
                 break
 
-            board_after_queens_marked = deepcopy(board)
+            queens_marked_checkpoint = board.checkpoint()
 
 
             # Narrowing-down logic
 
             ## cross off cells that if were queens, would block other color sets
-            blank_cells = board.get_blank_cells()
-            for cell in blank_cells:
-                if board.would_cell_block_color_set(cell): cell.status = CellStatus.CROSS
+            SolvingLogic._run_rule(board, 'axiom_1', axiom_1)
 
-            if Board.has_board_changed(board_after_queens_marked, board):
-                print(f"Turn {turn}: Crossed off cells that would block color sets")
+            if board.has_changed_since(queens_marked_checkpoint):
+                events.message('turn', f"Turn {turn}: Crossed off cells that would block color sets", 'axiom_1', turn)
                 turn += 1
 
 
             ## if n columns/rows contain the entirety of n colorsets, the cells of all other colors within those n columns/rows can be crossed
             for axis in ['row', 'col']:
-                colorset_axis_holdings: dict[str, frozenset[int]] = board.colorset_axis_holdings(axis)
-                change_made = False
-                changes_made_on = set()
-
-                # for each color, see what other color sets have the same or a subset of holdings
-                for color, my_holdings  in colorset_axis_holdings.items():
-                    for done_holding in changes_made_on:
-                        if my_holdings.issubset(done_holding): continue
-                    common_colors = [color]
-                    for other_color, others_holdings in colorset_axis_holdings.items():
-                        if other_color == color: continue
-                        if len(others_holdings) == 0: continue # important, otherwise it would be considered a subset
-                        if others_holdings.issubset(my_holdings): common_colors.append(other_color)
-                    if len(common_colors) == len(my_holdings):
-                        # the narrowing-down-logic condition is met
-                        # we can now cross off all other colors within these n columns/rows
-                        for idx1 in my_holdings:
-                            for idx2 in range(0, board.height):
-                                if axis == 'col': cell = board.cell_grid[idx2][idx1]
-                                else: cell = board.cell_grid[idx1][idx2]
-                                if cell.color not in common_colors and cell.status == CellStatus.BLANK: 
-                                    cell.status = CellStatus.CROSS
-                                    change_made = True
-                                    changes_made_on.add(frozenset(my_holdings))
-
-                if change_made:
+                changes_made_on = SolvingLogic._run_rule(board, f'axiom_2_{axis}s', lambda: SolvingLogic._axiom_2_on_axis(engine, axis))
+                if changes_made_on:
                     if axis == 'row': string = 'rows'
                     else: string = 'columns'
-                    print(f"Turn {turn}: Axis color common used on {string} {changes_made_on}")
+                    events.message('turn', f"Turn {turn}: Axis color common used on {string} {changes_made_on}", f'axiom_2_{axis}s', turn)
                     turn += 1
 
-            if not Board.has_board_changed(old_board, board): # if no change has happened, we will do the 1st narrowing-down logic axiom 2 times into the future
-                board_changed = False
-                blank_cells = board.get_blank_cells()
-                for cell in blank_cells:
-                    if board.would_cell_block_color_set_n(cell, 2): 
-                        cell.status = CellStatus.CROSS
-                        board_changed = True
-                        break # only do one change at a time to avoid crossing off independent thinking ahead results
-                if board_changed:
-                    print(f"Turn {turn}: Crossed off cells that would block color sets, thinking ahead {times_to_think_ahead} times.")
+            if not board.has_changed_since(turn_start): # if no change has happened, we will do the 1st narrowing-down logic axiom 2 times into the future
+                # only do one change at a time to avoid crossing off independent thinking ahead results
+                cell = think_ahead(2)
+                if cell is not None:
+                    events.message('turn', f"Turn {turn}: Crossed off cells that would block color sets, thinking ahead {times_to_think_ahead} times.", 'think_ahead', turn)
                     turn += 1
 
 
-            if not Board.has_board_changed(old_board, board): # if still no change has happened
+            if not board.has_changed_since(turn_start): # if still no change has happened
                 times_to_think_ahead += 1
                 if times_to_think_ahead > TIMES_TO_THINK_AHEAD_MAX:
-                    print(f"We are stuck, even tried thinking {TIMES_TO_THINK_AHEAD_MAX} moves ahead.")
+                    events.message('stuck', f"We are stuck, even tried thinking {TIMES_TO_THINK_AHEAD_MAX} moves ahead.")
                     break
             else:
                 times_to_think_ahead = TIMES_TO_THINK_AHEAD_MIN # reset this value
+
+        return turn
+
+
+class ScheduledRule(RuleCost):
+    """A cheap rule for CostAwareStrategy on the Board engine, with running averages of what it costs and what it yields."""
+
+    run: Callable[[], str | None]
+    """Runs the rule. Returns what it did (for the 'Turn ...' message) if it changed the board, else None."""
+    fruitless_at: int | None
+    """Board modification_count when the rule last changed nothing. The rules only look at the board, so until it changes, running it again is pointless."""
+
+    def __init__(self, name: str, run: Callable[[], str | None]):
+        super().__init__(name)
+        self.run = run
+        self.fruitless_at = None
+
+
+class CostAwareStrategy(AutoSolveStrategy):
+    """Runs the cheap rules (queen marking, axiom 2 and axiom 1 without thinking ahead) until none of them can change the board, best value
+    first - value is the recent cells changed per second of each rule, measured as we go (see RuleCost).
+    With the BitBoard engine that's a PropagationEngine on the same BitBoard, which only re-runs the rules of the rows, columns and colorsets
+    that changed and picks the next rule by value - kept from one round to the next, so it picks up the cells crossed by thinking ahead and
+    keeps its measurements. With the Board engine (use_bitboard=False), the rules are run over the whole board. They are re-ranked after
+    every pass, and a rule that changed nothing is skipped until the board changes.
+
+    Only when the cheap rules are stuck, it thinks ahead (the expensive part) - min_think_ahead moves ahead, then deeper up to max_think_ahead.
+    As soon as a cell is crossed that way, it's back to the cheap rules. If thinking max_think_ahead moves ahead finds nothing, we are stuck
+    (no point in trying the same again).
+    """
+
+    min_think_ahead: int
+    max_think_ahead: int
+    """Thinking ahead gets expensive quickly, so keep this low"""
+    smoothing: float
+    """Weight of the latest run in the running averages of the rules' cost and yield"""
+
+    def __init__(self, min_think_ahead: int = 2, max_think_ahead: int = 2, smoothing: float = 0.5):
+        self.min_think_ahead = min_think_ahead
+        self.max_think_ahead = max_think_ahead
+        self.smoothing = smoothing
+
+    def _cheap_rules(self, board: Board, engine: Board | BitBoard) -> list[ScheduledRule]:
+        def mark_queens():
+            if engine.mark_queens_where_certain(): return "Queens Marked"
+            return None
+
+        def axiom_1():
+            checkpoint = board.checkpoint()
+            for cell in engine.get_blank_cells():
+                if engine.would_cell_block_color_set(cell): engine.cross_cell(cell)
+            if board.has_changed_since(checkpoint): return "Crossed off cells that would block color sets"
+            return None
+
+        def axiom_2(axis: str, string: str):
+            changes_made_on = SolvingLogic._axiom_2_on_axis(engine, axis)
+            if changes_made_on: return f"Axis color common used on {string} {changes_made_on}"
+            return None
+
+        # in a guessed order of value, for the first round
+        return [
+            ScheduledRule('mark_queens', mark_queens),
+            ScheduledRule('axiom_1', axiom_1),
+            ScheduledRule('axiom_2_rows', lambda: axiom_2('row', 'rows')),
+            ScheduledRule('axiom_2_cols', lambda: axiom_2('col', 'columns')),
+        ]
+
+    def _run_ranked(self, board: Board, engine: Board, rules: list[ScheduledRule], cancel: threading.Event | None, report: Callable[[str, str], None]):
+        """Run the rules over the whole board, best value first, until none of them changes anything (the Board engine)."""
+        changed = True
+        while changed and not engine.is_game_over():
+            changed = False
+            # re-ranked after every pass
+            for rule in sorted(rules, key=ScheduledRule.value, reverse=True): # sorted is stable, so ties keep the guessed order
+                if rule.fruitless_at == board.modification_count: continue
+                SolvingLogic._check_cancelled(cancel)
+                checkpoint = board.checkpoint()
+                start = time.perf_counter()
+                did = SolvingLogic._run_rule(board, rule.name, rule.run)
+                rule.record(time.perf_counter() - start, board.checkpoint() - checkpoint, self.smoothing)
+                if did is None: rule.fruitless_at = board.modification_count
+                else:
+                    report(rule.name, did)
+                    changed = True
+                    if engine.is_game_over(): break
+
+    def solve(self, board: Board, engine: Board | BitBoard, think_ahead: Callable[[int], Cell | None], cancel: threading.Event | None) -> int:
+        turn = 0
+        events = SolvingLogic.events
+        if isinstance(engine, BitBoard): propagation, rules = PropagationEngine(board, engine, self.smoothing), None
+        else: propagation, rules = None, self._cheap_rules(board, engine)
+
+        def report(rule_name: str, did: str):
+            nonlocal turn
+            events.message('turn', f"Turn {turn}: {did}", rule_name, turn)
+            turn += 1
+
+        while True:
+            # the cheap rules, until none of them can change anything
+            if propagation is not None: propagation.run(cancel, report)
+            else: self._run_ranked(board, engine, rules, cancel, report)
+
+            if engine.is_game_over():
+                events.message('solved', "All queens found!")
+                return turn
+
+            # stuck - think ahead, deeper only if that finds nothing
+            for n in range(self.min_think_ahead, self.max_think_ahead + 1):
+                SolvingLogic._check_cancelled(cancel)
+                # only do one change at a time to avoid crossing off independent thinking ahead results
+                if think_ahead(n) is not None:
+                    events.message('turn', f"Turn {turn}: Crossed off cells that would block color sets, thinking ahead {n} times.", 'think_ahead', turn)
+                    turn += 1
+                    break
+            else:
+                events.message('stuck', f"We are stuck, even tried thinking {self.max_think_ahead} moves ahead.")
+                return turn
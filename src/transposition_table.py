@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TranspositionTable:
+    """Bounded memo for thinking-ahead results (would_cell_block_color_set_n), keyed on a board state, a cell and how many moves are left.
+
+    When full, the least recently used entry is evicted.
+    """
+
+    max_size: int
+    hits: int
+    """How many get() calls found a result"""
+    misses: int
+    """How many get() calls did not find a result"""
+    _entries: OrderedDict[Hashable, bool]
+    """Least recently used first"""
+
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self.hits = 0; self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> bool | None:
+        """Get the stored result for key, or None if there isn't one."""
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: Hashable, result: bool):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size: self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        self._entries.clear()
+        self.hits = 0; self.misses = 0
@@ -1,11 +1,28 @@
-# This script essentially tests the SolvingLogic auto_solve function
+# This script essentially tests the SolvingLogic auto_solve function (and the exact_solve and propagate functions, the solution cache, the corpus file format, and ArrayBoard and BatchSolver if NumPy is installed), the PuzzleGenerator, solve_stream.py and solve_server.py
 
 
+import http.client
+import json
 import os
 import pickle
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
 
-from src.queens_board import Board
-from src.solving_logic import SolvingLogic
+from convert_corpus import pack
+from solve_stream import iter_tasks, solve_line
+from src.corpus import CorpusReader, CorpusWriter
+from src.puzzle_generator import PuzzleGenerator
+from src.queens_board import Board, CellStatus
+from src.solution_cache import SolutionCache
+from src.solving_logic import PropagationEngine, SolvingLogic
+
+try: from src.array_board import ArrayBoard
+except ImportError: ArrayBoard = None # NumPy is optional
+try: from src.batch_solver import BatchSolver
+except ImportError: BatchSolver = None
 
 
 PUZZLE_START_DIRECTORY_PATH = "tests/puzzle_starts"
@@ -42,6 +59,186 @@ for puzzle in puzzles:
         all_tests_passed = False
         print(f"{RED}Puzzle {puzzle} failed!{RESET}")
 
+    # the puzzles should have exactly one solution
+    if not SolvingLogic.count_solutions(Board.from_json(filepath)).is_unique():
+        all_tests_passed = False
+        print(f"{RED}Puzzle {puzzle} does not have exactly one solution!{RESET}")
+
+    # the exact solver should find the same solution
+    board = Board.from_json(filepath)
+    SolvingLogic.exact_solve(board)
+    if truth_statuses != board.to_status_grid():
+        all_tests_passed = False
+        print(f"{RED}Puzzle {puzzle} failed with exact_solve!{RESET}")
+
+    # so should propagating first (the work queue engine on its own, which measures every rule to rank them), then solving the rest
+    board = Board.from_json(filepath)
+    propagation = PropagationEngine(board)
+    propagation.run()
+    SolvingLogic.auto_solve(board)
+    if truth_statuses != board.to_status_grid() or any(cost.runs == 0 for cost in propagation.costs.values()):
+        all_tests_passed = False
+        print(f"{RED}Puzzle {puzzle} failed with propagate!{RESET}")
+
+    # so should the NumPy backed board, on the Board engine
+    if ArrayBoard is not None:
+        board = ArrayBoard.from_json(filepath)
+        SolvingLogic.auto_solve(board, use_bitboard=False)
+        if truth_statuses != board.to_status_grid():
+            all_tests_passed = False
+            print(f"{RED}Puzzle {puzzle} failed with ArrayBoard!{RESET}")
+
     print("\n\n")
 
+# the batch solver should solve the puzzles (the ones of the same size together) the same way
+if BatchSolver is not None:
+    puzzles_by_size: dict[int, list[str]] = {}
+    for puzzle in puzzles:
+        board = Board.from_json(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}")
+        puzzles_by_size.setdefault(board.length, []).append(puzzle)
+    for size_puzzles in puzzles_by_size.values():
+        boards = [Board.from_json(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}") for puzzle in size_puzzles]
+        for puzzle, status_grid in zip(size_puzzles, BatchSolver.solve(boards)):
+            with open(f"{TRUTH_DIRECTORY_PATH}/{os.path.splitext(puzzle)[0]}.pkl", "rb") as f:
+                if pickle.load(f) != status_grid:
+                    all_tests_passed = False
+                    print(f"{RED}Puzzle {puzzle} failed with BatchSolver!{RESET}")
+
+    # one queen per row, column and colorset, but touching diagonally, is not a solution
+    board = Board.from_dict({"rows": 2, "cols": 2, "colors": [["#aaaaaa", "#aaaaaa"], ["#bbbbbb", "#bbbbbb"]]})
+    for row in board.cell_grid:
+        for cell in row: board.set_cell_status(cell, CellStatus.QUEEN if cell.x == cell.y else CellStatus.CROSS)
+    if BatchSolver._propagate(*BatchSolver._stack([board]))[2][0]:
+        all_tests_passed = False
+        print(f"{RED}BatchSolver took diagonally touching queens for valid!{RESET}")
+
+# the second time round, the solution cache should give the same answers (passed to auto_solve, as the GUI does, or set for all solves)
+with tempfile.TemporaryDirectory() as directory:
+    cache = SolutionCache(os.path.join(directory, "solutions.sqlite3"))
+    for puzzle in puzzles:
+        with open(f"{TRUTH_DIRECTORY_PATH}/{os.path.splitext(puzzle)[0]}.pkl", "rb") as f:
+            truth_statuses = pickle.load(f)
+        for attempt in range(0, 2):
+            board = Board.from_json(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}")
+            turns = SolvingLogic.auto_solve(board, solution_cache=cache)
+            if truth_statuses != board.to_status_grid() or (attempt == 1 and turns != 0):
+                all_tests_passed = False
+                print(f"{RED}Puzzle {puzzle} failed with the solution cache!{RESET}")
+        SolvingLogic.solution_cache = cache
+        board = Board.from_json(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}")
+        if SolvingLogic.auto_solve(board) != 0 or truth_statuses != board.to_status_grid():
+            all_tests_passed = False
+            print(f"{RED}Puzzle {puzzle} failed with SolvingLogic.solution_cache!{RESET}")
+        SolvingLogic.solution_cache = None
+    cache.close()
+
+# packing the puzzles and their truths into a corpus file should keep them as they are
+with tempfile.TemporaryDirectory() as directory:
+    pack([PUZZLE_START_DIRECTORY_PATH], os.path.join(directory, "tests.qnsc"), TRUTH_DIRECTORY_PATH)
+    with CorpusReader(os.path.join(directory, "tests.qnsc")) as corpus:
+        for corpus_puzzle in corpus:
+            with open(f"{PUZZLE_START_DIRECTORY_PATH}/{corpus_puzzle.name}.json", "rt") as f: puzzle_dict = json.load(f)
+            with open(f"{TRUTH_DIRECTORY_PATH}/{corpus_puzzle.name}.pkl", "rb") as f: truth_statuses = pickle.load(f)
+            if corpus_puzzle.puzzle != puzzle_dict or corpus_puzzle.solution != truth_statuses:
+                all_tests_passed = False
+                print(f"{RED}Puzzle {corpus_puzzle.name} changed in the corpus file!{RESET}")
+    # and a puzzle that doesn't fit the file layout should be refused with a ValueError, not a struct.error
+    with CorpusWriter(os.path.join(directory, "too_wide.qnsc")) as writer:
+        try:
+            writer.add("too_wide", {"rows": 1, "cols": 256, "colors": [["#ffffff"] * 256]})
+            all_tests_passed = False
+            print(f"{RED}A puzzle with 256 columns was packed into a corpus file!{RESET}")
+        except ValueError: pass
+
+# generated puzzles should have exactly one solution
+generator = PuzzleGenerator(0)
+for size in [5, 8, 10]:
+    puzzle = generator.generate(size)
+    if not SolvingLogic.count_solutions(Board.from_dict(puzzle)).is_unique():
+        all_tests_passed = False
+        print(f"{RED}Generated {size}x{size} puzzle does not have exactly one solution!{RESET}")
+
+# muting the solver on one thread (as the GUI's solver thread does) shouldn't mute it on the others
+muted, unmute = threading.Event(), threading.Event()
+def solve_muted():
+    with SolvingLogic.events.listening_only():
+        muted.set()
+        unmute.wait()
+muting_thread = threading.Thread(target=solve_muted)
+muting_thread.start()
+muted.wait()
+if not SolvingLogic.events.listeners:
+    all_tests_passed = False
+    print(f"{RED}SolvingLogic.events.listening_only on another thread muted this one!{RESET}")
+unmute.set()
+muting_thread.join()
+
+# solve_stream.py should tag each result with the puzzle's id (or its line number), skip blank lines, and answer a malformed line with an error
+stream_lines = []
+for puzzle in puzzles[:3]:
+    with open(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}", "rt") as f: puzzle_dict = json.load(f)
+    stream_lines.append(json.dumps({"id": os.path.splitext(puzzle)[0], **puzzle_dict}) + "\n")
+stream_lines += ["\n", "{not json\n"]
+tasks = list(iter_tasks(stream_lines, "auto"))
+results = [json.loads(solve_line(task)) for task in tasks]
+expected_ids = [os.path.splitext(puzzle)[0] for puzzle in puzzles[:3]] + [5]
+if [number for number, _, _ in tasks] != [1, 2, 3, 5] or [result["id"] for result in results] != expected_ids:
+    all_tests_passed = False
+    print(f"{RED}solve_stream.py gave the ids {[result['id'] for result in results]}, not {expected_ids}!{RESET}")
+for puzzle, result in zip(puzzles[:3], results):
+    with open(f"{TRUTH_DIRECTORY_PATH}/{os.path.splitext(puzzle)[0]}.pkl", "rb") as f: truth_statuses = pickle.load(f)
+    if result["outcome"] != "solved" or result["solution"] != truth_statuses:
+        all_tests_passed = False
+        print(f"{RED}Puzzle {puzzle} failed with solve_stream.py!{RESET}")
+if results[-1]["outcome"] != "error" or "error" not in results[-1]:
+    all_tests_passed = False
+    print(f"{RED}solve_stream.py answered a malformed line with {results[-1]}!{RESET}")
+
+# the solver server should answer /health, a puzzle, a list of puzzles (spread over the workers), an empty list and /metrics
+server = subprocess.Popen([sys.executable, "solve_server.py", "--port", "0", "--workers", "2"], stdout=subprocess.PIPE, text=True)
+try:
+    host, port = server.stdout.readline().strip().removeprefix("Listening on http://").rsplit(":", 1)
+    connection = http.client.HTTPConnection(host, int(port), timeout=30)
+    def request(method: str, path: str, body: str | None = None) -> tuple[int, str]:
+        connection.request(method, path, body)
+        response = connection.getresponse()
+        return response.status, response.read().decode()
+
+    puzzle = puzzles[0]
+    with open(f"{PUZZLE_START_DIRECTORY_PATH}/{puzzle}", "rt") as f: puzzle_body = f.read()
+    with open(f"{TRUTH_DIRECTORY_PATH}/{os.path.splitext(puzzle)[0]}.pkl", "rb") as f: truth_statuses = pickle.load(f)
+    status, health = request("GET", "/health")
+    if status != 200 or health != "ok\n":
+        all_tests_passed = False
+        print(f"{RED}solve_server.py /health answered {status} {health!r}!{RESET}")
+    status, result = request("POST", "/solve", puzzle_body)
+    if status != 200 or json.loads(result)["solution"] != truth_statuses:
+        all_tests_passed = False
+        print(f"{RED}Puzzle {puzzle} failed with solve_server.py: {status} {result}{RESET}")
+    list_bodies = []; list_truths = []
+    for list_puzzle in puzzles[:4]:
+        with open(f"{PUZZLE_START_DIRECTORY_PATH}/{list_puzzle}", "rt") as f: list_bodies.append(f.read())
+        with open(f"{TRUTH_DIRECTORY_PATH}/{os.path.splitext(list_puzzle)[0]}.pkl", "rb") as f: list_truths.append(pickle.load(f))
+    list_body = "[" + ",".join(list_bodies) + "]"
+    status, result = request("POST", "/solve", list_body)
+    if status != 200 or [list_result["solution"] for list_result in json.loads(result)] != list_truths:
+        all_tests_passed = False
+        print(f"{RED}A list of puzzles failed with solve_server.py: {status} {result}{RESET}")
+    status, result = request("POST", "/solve", "[]")
+    if status != 200 or json.loads(result) != []:
+        all_tests_passed = False
+        print(f"{RED}solve_server.py answered an empty list with {status} {result}!{RESET}")
+    status, metrics = request("GET", "/metrics")
+    # with a worker idle, every puzzle is handed over on its own - not the whole list to one worker
+    if (status != 200 or 'queens_requests_total{path="/solve",status="200"} 3' not in metrics or 'queens_puzzles_total{outcome="solved"} 5' not in metrics
+            or "queens_batch_size_count 5" not in metrics or "queens_batch_size_sum 5.0" not in metrics):
+        all_tests_passed = False
+        print(f"{RED}solve_server.py /metrics answered {status}:\n{metrics}{RESET}")
+    connection.close()
+finally:
+    # Ctrl+C, so the server stops its workers too
+    if os.name != "nt": server.send_signal(signal.SIGINT)
+    else: server.terminate()
+    server.wait(timeout=30)
+
 if all_tests_passed: print(f"{GREEN}All tests passed.{RESET}")
\ No newline at end of file